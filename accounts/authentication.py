@@ -0,0 +1,91 @@
+import atexit
+import threading
+
+from django.conf import settings
+from django.db import connection
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.settings import api_settings
+
+from accounts.cache import cache_user, get_cached_user
+from accounts.models import User
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+    """
+    JWTAuthentication that resolves the token's user from the cache, so
+    authenticated requests don't each look the user up. Only active users
+    are cached, and saving or deleting a user evicts it.
+    """
+
+    def get_user(self, validated_token):
+        user_id = validated_token.get(api_settings.USER_ID_CLAIM)
+        user = get_cached_user(user_id) if user_id is not None else None
+        if user is None:
+            user = super().get_user(validated_token)
+            cache_user(user)
+        elif not user.is_active:
+            raise AuthenticationFailed("User is inactive", code="user_inactive")
+        return user
+
+
+class LastLoginWriter:
+    """
+    Buffers the last_login of users logging in and writes them together
+    with a single UPDATE ... FROM (VALUES ...), at most
+    AUTH_LAST_LOGIN_FLUSH_SECONDS after the first buffered login, once
+    AUTH_LAST_LOGIN_BATCH_SIZE users are waiting, and when the process
+    exits. A user logging in several times is written once.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.pending = {}
+        self.timer = None
+        atexit.register(self.flush)
+
+    def record(self, user, when):
+        with self.lock:
+            self.pending[user.pk] = max(when, self.pending.get(user.pk, when))
+            full = len(self.pending) >= settings.AUTH_LAST_LOGIN_BATCH_SIZE
+            if not full and self.timer is None:
+                self.timer = threading.Timer(settings.AUTH_LAST_LOGIN_FLUSH_SECONDS, self.flush_in_background)
+                self.timer.daemon = True
+                self.timer.start()
+        if full:
+            self.flush()
+
+    def flush_in_background(self):
+        try:
+            self.flush()
+        finally:
+            # The timer thread's connection isn't closed by any request
+            connection.close()
+
+    def flush(self):
+        """
+        Writes out the buffered logins. Returns the number of users updated.
+        """
+        with self.lock:
+            pending, self.pending = self.pending, {}
+            if self.timer is not None:
+                self.timer.cancel()
+                self.timer = None
+        if not pending:
+            return 0
+
+        sql = """
+            UPDATE %s AS u SET last_login = v.last_login
+            FROM (VALUES %s) AS v(id, last_login)
+            WHERE u.id = v.id AND (u.last_login IS NULL OR u.last_login < v.last_login)
+        """ % (
+            connection.ops.quote_name(User._meta.db_table),
+            ", ".join(["(CAST(%s AS uuid), CAST(%s AS timestamp with time zone))"] * len(pending)),
+        )
+        params = [value for row in pending.items() for value in row]
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
+            return cursor.rowcount
+
+
+last_logins = LastLoginWriter()
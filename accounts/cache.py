@@ -0,0 +1,113 @@
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS
+
+
+# What authentication and permission checks read. The rest, the password
+# hash above all, is never cached. Only User.save() and delete() evict a
+# user: changes made with QuerySet.update() or SQL are picked up once the
+# entry expires, after AUTH_USER_CACHE_SECONDS
+CACHED_USER_FIELDS = ["id", "username", "is_active", "is_staff", "is_superuser"]
+
+# Seconds an evicted user can't be cached again, so a request that read the
+# user before the change was committed can't put the old row back
+EVICTED_SECONDS = 30
+
+
+def user_cache_key(user_id):
+    return f"accounts:user:fields:{user_id}"
+
+
+class LocalUserCache:
+    """
+    Bounded LRU of the cached fields of the users resolved by this process,
+    each kept for AUTH_USER_LOCAL_CACHE_SECONDS. Saves in other processes
+    can't evict these entries, so the TTL is kept short.
+    """
+
+    def __init__(self, maxsize=1024):
+        self.maxsize = maxsize
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()
+
+    def get(self, user_id):
+        with self.lock:
+            entry = self.entries.get(user_id)
+            if entry is None:
+                return None
+            expires, values = entry
+            if expires < time.monotonic():
+                del self.entries[user_id]
+                return None
+            self.entries.move_to_end(user_id)
+            return values
+
+    def set(self, user_id, values):
+        with self.lock:
+            self.entries[user_id] = (time.monotonic() + settings.AUTH_USER_LOCAL_CACHE_SECONDS, values)
+            self.entries.move_to_end(user_id)
+            while len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+
+    def delete(self, user_id):
+        with self.lock:
+            self.entries.pop(user_id, None)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+
+local_users = LocalUserCache()
+
+
+def load_user(values):
+    """
+    A user with only the cached fields loaded. The others are deferred, so
+    reading one queries the database, and saving only writes those loaded.
+    """
+    model = get_user_model()
+    # from_db takes the values in the order of the model's fields
+    names = [field.attname for field in model._meta.concrete_fields if field.attname in values]
+    return model.from_db(DEFAULT_DB_ALIAS, names, [values[name] for name in names])
+
+
+def get_cached_user(user_id):
+    """
+    The user with this id as last resolved, first from this process, then
+    from the shared cache. None if neither has it. Each call builds a user
+    of its own, so requests never share one.
+    """
+    user_id = str(user_id)
+    values = local_users.get(user_id)
+    if values is None:
+        values = cache.get(user_cache_key(user_id))
+        # False marks a user just evicted
+        if not values:
+            return None
+        local_users.set(user_id, values)
+    return load_user(values)
+
+
+def cache_user(user):
+    user_id = str(user.pk)
+    values = {name: getattr(user, name) for name in CACHED_USER_FIELDS}
+    # Only added over nothing, never over a user just evicted
+    if cache.add(user_cache_key(user_id), values, settings.AUTH_USER_CACHE_SECONDS):
+        local_users.set(user_id, values)
+
+
+def forget_user(user_id):
+    """
+    Drops a user from the shared cache and this process' cache, and keeps
+    it out of the shared cache for EVICTED_SECONDS. Other processes may
+    serve their copy until it expires locally.
+    """
+    user_id = str(user_id)
+    cache.set(user_cache_key(user_id), False, EVICTED_SECONDS)
+    local_users.delete(user_id)
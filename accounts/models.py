@@ -1,8 +1,24 @@
 import uuid
 
-from django.db import models
+from django.db import models, transaction
 from django.contrib.auth.models import AbstractUser
 
+from accounts.cache import forget_user
+
 
 class User(AbstractUser):
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        # Authentication resolves users from the cache, which must not keep
+        # e.g. a deactivated user. Evicted once committed, or a request in
+        # between could cache the old row again
+        pk = self.pk
+        transaction.on_commit(lambda: forget_user(pk))
+
+    def delete(self, *args, **kwargs):
+        pk = self.pk
+        result = super().delete(*args, **kwargs)
+        transaction.on_commit(lambda: forget_user(pk))
+        return result
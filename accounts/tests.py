@@ -1,3 +1,84 @@
+from django.core.cache import cache
 from django.test import TestCase
+from rest_framework.test import APIRequestFactory
+from rest_framework_simplejwt.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.tokens import AccessToken
 
-# Create your tests here.
+from accounts.authentication import CachedJWTAuthentication, last_logins
+from accounts.cache import cache_user, forget_user, local_users, user_cache_key
+from accounts.models import User
+
+
+class AuthenticationTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        local_users.clear()
+        self.user = User.objects.create_user(username="pg", password="s3cret-pass")
+
+    def authenticate(self):
+        token = AccessToken.for_user(self.user)
+        request = APIRequestFactory().get("/all/", HTTP_AUTHORIZATION=f"Bearer {token}")
+        return CachedJWTAuthentication().authenticate(request)[0]
+
+    def test_users_are_resolved_from_the_cache(self):
+        self.assertEqual(self.authenticate(), self.user)
+        local_users.clear()
+        with self.assertNumQueries(0):
+            self.assertEqual(self.authenticate(), self.user)
+
+    def test_requests_get_users_of_their_own(self):
+        self.authenticate()
+        user = self.authenticate()
+        user.username = "changed"
+        self.assertEqual(self.authenticate().username, "pg")
+
+    def test_password_hashes_are_not_cached(self):
+        self.authenticate()
+        local_users.clear()
+        user = self.authenticate()
+        self.assertEqual(user.username, "pg")
+        self.assertNotIn(self.user.password, str(cache.get(user_cache_key(self.user.pk))))
+        self.assertIn("password", user.get_deferred_fields())
+
+    def test_deactivated_users_are_evicted_once_committed(self):
+        self.authenticate()
+        with self.captureOnCommitCallbacks() as callbacks:
+            self.user.is_active = False
+            self.user.save()
+        self.assertTrue(self.authenticate().is_active)
+
+        for callback in callbacks:
+            callback()
+        with self.assertRaises(AuthenticationFailed):
+            self.authenticate()
+
+    def test_deactivated_users_requests_are_rejected(self):
+        headers = {"HTTP_AUTHORIZATION": f"Bearer {AccessToken.for_user(self.user)}"}
+        self.assertEqual(self.client.get("/all/", **headers).status_code, 200)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.is_active = False
+            self.user.save()
+        self.assertEqual(self.client.get("/all/", **headers).status_code, 401)
+
+    def test_evicted_users_are_not_cached_again_from_an_old_read(self):
+        stale = User.objects.get(pk=self.user.pk)
+        self.authenticate()
+        User.objects.filter(pk=self.user.pk).update(is_active=False)
+        forget_user(self.user.pk)
+
+        # A request that read the user before the change finishes after the eviction
+        cache_user(stale)
+        with self.assertRaises(AuthenticationFailed):
+            self.authenticate()
+
+    def test_logins_are_written_in_batches(self):
+        for _ in range(2):
+            response = self.client.post("/users/login/", {"username": "pg", "password": "s3cret-pass"})
+            self.assertEqual(response.status_code, 200)
+        self.user.refresh_from_db()
+        self.assertIsNone(self.user.last_login)
+
+        with self.assertNumQueries(1):
+            self.assertEqual(last_logins.flush(), 1)
+        self.user.refresh_from_db()
+        self.assertIsNotNone(self.user.last_login)
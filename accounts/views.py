@@ -5,6 +5,7 @@ from rest_framework_simplejwt.tokens import RefreshToken
 from rest_framework import status
 from django.utils import timezone
 
+from accounts.authentication import last_logins
 from accounts.models import User
 from accounts.serializers import UserSerializer, LoginSerializer
 from config.pagination import CustomPagination
@@ -29,7 +30,8 @@ class UserViewSet(viewsets.ModelViewSet):
             token = RefreshToken.for_user(user)
             data = serializer.data
             data["tokens"] = {"refresh": str(token), "access": str(token.access_token)}
-            User.objects.filter(id=user.id).update(last_login=timezone.now())
+            # Written in batches with other logins, not on this request
+            last_logins.record(user, timezone.now())
             return Response(data, status=status.HTTP_200_OK)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
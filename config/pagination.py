@@ -1,6 +1,210 @@
+import base64
+import datetime
+import hashlib
+import json
+from collections import OrderedDict
+
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.db import connections
+from django.db.models import Q
+from django.db.models.lookups import Exact, In, IsNull
+from django.db.models.sql.where import AND
+from rest_framework.exceptions import NotFound
 from rest_framework.pagination import PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
 
 class CustomPagination(PageNumberPagination):
     page_size = 20
     page_size_query_param = 'page_size'
     max_page_size = 100
+
+
+def get_estimable_filter(queryset):
+    """
+    The model the queryset's filters apply to and the filters, as a Q, when
+    the planner can estimate them well from the column statistics: the
+    item type, and whether a column is null. None otherwise.
+    """
+    where = queryset.query.where
+    if not where.children or where.connector != AND or where.negated:
+        return None
+    models, conditions = set(), Q()
+    for lookup in where.children:
+        target = getattr(getattr(lookup, "lhs", None), "target", None)
+        if target is None or not (
+            isinstance(lookup, IsNull) or (isinstance(lookup, (Exact, In)) and target.name == "type")
+        ):
+            return None
+        models.add(target.model)
+        conditions &= Q(**{f"{target.name}__{lookup.lookup_name}": lookup.rhs})
+    if len(models) != 1:
+        return None
+    return models.pop(), conditions
+
+
+def approximate_count(queryset):
+    """
+    Counts rows without scanning the whole table. Unfiltered querysets use
+    the planner's row estimate, as do querysets filtered by type or by null
+    columns alone, such as the per-type lists and the ranked feeds. Other
+    ones use an exact count cached for a minute.
+    """
+    connection = connections[queryset.db]
+    estimable = get_estimable_filter(queryset)
+    if connection.vendor == "postgresql" and (estimable or not queryset.query.where):
+        table = queryset.model._meta.db_table
+        tables = sorted({join.table_name for join in queryset.query.alias_map.values()} | {table})
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT relname, reltuples::bigint FROM pg_class WHERE relname = ANY(%s)", [tables])
+            estimates = dict(cursor.fetchall())
+            # reltuples is 0 or -1 until a table has been analyzed, and the
+            # planner's estimates are guesses until then
+            if len(estimates) == len(tables) and min(estimates.values()) > 0:
+                if not estimable:
+                    return estimates[table]
+                # Estimated on the table the filters apply to alone: the
+                # planner doesn't know that a child table only joins rows of
+                # its type
+                model, conditions = estimable
+                sql, params = model._base_manager.filter(conditions).query.sql_with_params()
+                cursor.execute("EXPLAIN (FORMAT JSON) " + sql, params)
+                return min(cursor.fetchone()[0][0]["Plan"]["Plan Rows"], *estimates.values())
+
+    key = "pagination:count:" + hashlib.md5(str(queryset.query).encode()).hexdigest()
+    return cache.get_or_set(key, queryset.count, 60)
+
+
+class KeysetPagination(CustomPagination):
+    """
+    Cursor pagination keyed on (time, pk), so every page costs one index
+    range scan however deep it is. Items without a time come last, ordered
+    by pk. Querysets ordered by a field then pk, both descending, such as
+    the ranked feeds, are keyed on that field instead. The count in the
+    response is approximate, and only computed for paginated responses.
+
+    Falls back to page-number pagination when ?page= is given, or when the
+    queryset has another ordering (e.g. search results ordered by rank).
+    """
+    cursor_query_param = "cursor"
+    invalid_cursor_message = "Invalid cursor."
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.field = self.get_keyset_field(queryset)
+        self.keyset = "page" not in request.query_params and self.field is not None
+        if not self.keyset:
+            return super().paginate_queryset(queryset, request, view)
+
+        self.page_size = self.get_page_size(request)
+        self.queryset = queryset
+        self.cursor = self.decode_cursor(request)
+
+        rows = self.get_rows(queryset, self.page_size + 1)
+        self.has_more = len(rows) > self.page_size
+        self.rows = rows[:self.page_size]
+        if self.cursor is not None and self.cursor[2]:
+            self.rows.reverse()
+        return self.rows
+
+    def get_keyset_field(self, queryset):
+        """
+        The model field pages are keyed on, along with pk, or None when the
+        queryset's ordering can't be paged with a cursor.
+        """
+        ordering = tuple(queryset.query.order_by)
+        if not ordering:
+            return queryset.model._meta.get_field("time")
+        pk = queryset.model._meta.pk
+        pks = ("-pk", "-" + pk.name, "-" + pk.attname)
+        if len(ordering) == 2 and all(isinstance(name, str) for name in ordering):
+            if ordering[0].startswith("-") and ordering[1] in pks:
+                return queryset.model._meta.get_field(ordering[0][1:])
+        return None
+
+    def get_rows(self, queryset, limit):
+        """
+        Up to limit rows after the cursor, or before it, nearest first, when
+        paging back. Rows with and without a key are read with separate
+        range scans, the second only when the first runs out, so only the
+        page where keyed rows end costs an extra query.
+        """
+        name = self.field.name
+        keyed = queryset.filter(**{f"{name}__isnull": False})
+        unkeyed = queryset.filter(**{f"{name}__isnull": True})
+        if self.cursor is None:
+            scans = [keyed.order_by(f"-{name}", "-pk"), unkeyed.order_by("-pk")]
+        else:
+            value, pk, reverse = self.cursor
+            if reverse and value is None:
+                scans = [unkeyed.filter(pk__gt=pk).order_by("pk"), keyed.order_by(name, "pk")]
+            elif reverse:
+                after = Q(**{f"{name}__gt": value}) | Q(**{name: value, "pk__gt": pk})
+                scans = [keyed.filter(after).order_by(name, "pk")]
+            elif value is None:
+                scans = [unkeyed.filter(pk__lt=pk).order_by("-pk")]
+            else:
+                before = Q(**{f"{name}__lt": value}) | Q(**{name: value, "pk__lt": pk})
+                scans = [keyed.filter(before).order_by(f"-{name}", "-pk"), unkeyed.order_by("-pk")]
+
+        rows = []
+        for scan in scans:
+            rows += scan[:limit - len(rows)]
+            if len(rows) == limit:
+                break
+        return rows
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            position = json.loads(base64.urlsafe_b64decode(encoded.encode()).decode())
+            value = None
+            if position["t"] is not None:
+                value = self.field.to_python(position["t"])
+                if value is None:
+                    raise ValueError
+            pk = self.queryset.model._meta.pk.to_python(position["k"])
+            if pk is None:
+                raise ValueError
+            return value, pk, bool(position.get("r"))
+        except (TypeError, ValueError, KeyError, ValidationError):
+            raise NotFound(self.invalid_cursor_message)
+
+    def encode_cursor(self, row, reverse):
+        value = getattr(row, self.field.attname)
+        if isinstance(value, datetime.datetime):
+            value = value.isoformat()
+        position = {"t": value, "k": str(row.pk), "r": int(reverse)}
+        encoded = base64.urlsafe_b64encode(json.dumps(position).encode()).decode()
+        url = remove_query_param(self.request.build_absolute_uri(), "page")
+        return replace_query_param(url, self.cursor_query_param, encoded)
+
+    def get_next_link(self):
+        if not self.keyset:
+            return super().get_next_link()
+        reverse = self.cursor is not None and self.cursor[2]
+        if not self.rows or not (self.has_more or reverse):
+            return None
+        return self.encode_cursor(self.rows[-1], reverse=False)
+
+    def get_previous_link(self):
+        if not self.keyset:
+            return super().get_previous_link()
+        reverse = self.cursor is not None and self.cursor[2]
+        if not self.rows or self.cursor is None or (reverse and not self.has_more):
+            return None
+        return self.encode_cursor(self.rows[0], reverse=True)
+
+    def get_paginated_response(self, data):
+        if not self.keyset:
+            return super().get_paginated_response(data)
+        return Response(OrderedDict([
+            ('count', approximate_count(self.queryset)),
+            ('next', self.get_next_link()),
+            ('previous', self.get_previous_link()),
+            ('results', data),
+        ]))
@@ -0,0 +1,114 @@
+import hashlib
+import random
+import threading
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS
+
+
+SAFE_METHODS = ("GET", "HEAD", "OPTIONS")
+
+# Always read from the primary: the cache table holds the data generation,
+# and sessions are read right after logging in
+PRIMARY_APPS = {"django_cache", "sessions"}
+
+_state = threading.local()
+
+
+def get_replicas():
+    """
+    The aliases of the read replicas: every database but the default one.
+    """
+    return [alias for alias in settings.DATABASES if alias != DEFAULT_DB_ALIAS]
+
+
+def get_replica():
+    """
+    The replica the reads of this thread go to, None for the primary.
+    """
+    return getattr(_state, "replica", None)
+
+
+@contextmanager
+def use_replica():
+    """
+    Sends the reads made in the block to one replica picked at random, so
+    they all see the same snapshot. Without replicas, nothing changes.
+    """
+    previous = getattr(_state, "replica", None)
+    replicas = get_replicas()
+    _state.replica = random.choice(replicas) if replicas else None
+    try:
+        yield _state.replica
+    finally:
+        _state.replica = previous
+
+
+class ReplicaRouter:
+    """
+    Writes, and reads outside use_replica (the sync worker, management
+    commands, unsafe requests), go to the primary. The replicas have the
+    same data, so relations between them are allowed, and are migrated
+    through replication, never directly.
+    """
+
+    def db_for_read(self, model, **hints):
+        if model._meta.app_label in PRIMARY_APPS:
+            return DEFAULT_DB_ALIAS
+        return get_replica()
+
+    def db_for_write(self, model, **hints):
+        # Even for instances that were read from a replica
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == DEFAULT_DB_ALIAS
+
+
+class ReplicaMiddleware:
+    """
+    Serves GET, HEAD and OPTIONS requests from a replica. A client that
+    sent anything else, identified by its Authorization header or session
+    cookie, reads from the primary for the next REPLICA_STICKY_SECONDS, so
+    it sees its own writes despite replication lag.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        key = self.get_sticky_key(request)
+        if request.method not in SAFE_METHODS:
+            response = self.get_response(request)
+            if key:
+                cache.set(key, True, settings.REPLICA_STICKY_SECONDS)
+            return response
+
+        if not get_replicas() or (key and cache.get(key)):
+            return self.get_response(request)
+
+        with use_replica() as replica:
+            response = self.get_response(request)
+        if response.streaming:
+            response.streaming_content = self.stream_from(replica, response.streaming_content)
+        return response
+
+    def get_sticky_key(self, request):
+        client = request.headers.get("Authorization") or request.COOKIES.get(settings.SESSION_COOKIE_NAME)
+        if not client:
+            return None
+        return "quickcheck:replica:sticky:%s" % hashlib.sha256(client.encode()).hexdigest()
+
+    def stream_from(self, replica, content):
+        # Streamed responses query while they are sent, after the view returned
+        previous = getattr(_state, "replica", None)
+        _state.replica = replica
+        try:
+            yield from content
+        finally:
+            _state.replica = previous
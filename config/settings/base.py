@@ -14,7 +14,7 @@ import os
 from pathlib import Path
 from datetime import timedelta
 
-from decouple import config
+from decouple import Csv, config
 
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -47,6 +47,7 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
 ]
 
 # Third party apps
@@ -64,6 +65,9 @@ INSTALLED_APPS += [
 ]
 
 MIDDLEWARE = [
+    'quickcheck.metrics.RequestMetricsMiddleware',
+    'quickcheck.profiling.ProfilingMiddleware',
+    'config.routers.ReplicaMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'whitenoise.middleware.WhiteNoiseMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -139,19 +143,67 @@ STATICFILES_STORAGE = 'whitenoise.storage.CompressedManifestStaticFilesStorage'
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
+# Read replicas, as database URLs. Safe requests read from them; writes, the sync worker
+# and clients that just wrote use the default database
+DATABASE_REPLICA_URLS = config("DATABASE_REPLICA_URLS", default="", cast=Csv())
+DATABASE_ROUTERS = ["config.routers.ReplicaRouter"]
+# Seconds a client reads from the default database after a write, to see its own changes
+REPLICA_STICKY_SECONDS = config("REPLICA_STICKY_SECONDS", default=10, cast=int)
+# Seconds replicas may take to replay a write. Until then, responses read from them are
+# neither cached nor given an ETag, since they may predate the write
+REPLICA_LAG_SECONDS = config("REPLICA_LAG_SECONDS", default=10, cast=int)
+
 AUTH_USER_MODEL = "accounts.User"
 
+# Seconds anonymous list and detail responses stay cached. Writes invalidate them sooner
+RESPONSE_CACHE_TIMEOUT = config("RESPONSE_CACHE_TIMEOUT", default=300, cast=int)
+# When set, /metrics must be scraped with an "Authorization: Bearer <token>" header
+METRICS_TOKEN = config("METRICS_TOKEN", default="")
+# Share of requests profiled, from 0 (off) to 1. Profiled responses get a Server-Timing
+# header; those slower than PROFILE_SLOW_SECONDS are logged with their repeated queries
+PROFILE_SAMPLE_RATE = config("PROFILE_SAMPLE_RATE", default=0.0, cast=float)
+PROFILE_SLOW_SECONDS = config("PROFILE_SLOW_SECONDS", default=0.5, cast=float)
+# Rows fetched per round trip from the server-side cursor of an item export
+EXPORT_CHUNK_SIZE = config("EXPORT_CHUNK_SIZE", default=2000, cast=int)
+
 HACKER_NEWS_API_URL = "https://hacker-news.firebaseio.com/v0"
 
+# Number of items fetched from Hacker News in parallel during a sync
+HN_SYNC_CONCURRENCY = config("HN_SYNC_CONCURRENCY", default=16, cast=int)
+HN_SYNC_TIMEOUT = config("HN_SYNC_TIMEOUT", default=10, cast=int)
+# Number of synced items written to the database per transaction
+HN_SYNC_BATCH_SIZE = config("HN_SYNC_BATCH_SIZE", default=500, cast=int)
+# Size of the HN_id -> pk cache used to resolve parents, and how many HN ids
+# below the last synced item are preloaded into it
+HN_SYNC_RESOLVER_SIZE = config("HN_SYNC_RESOLVER_SIZE", default=50000, cast=int)
+HN_SYNC_RESOLVER_WINDOW = config("HN_SYNC_RESOLVER_WINDOW", default=20000, cast=int)
+# Minutes between syncs run by `manage.py hn_sync_worker`
+HN_SYNC_INTERVAL_MINUTES = config("HN_SYNC_INTERVAL_MINUTES", default=5, cast=int)
+# Only items posted within this many hours are ranked in the top and best
+# feeds, whose scores are recomputed this many items per transaction
+HN_RANK_WINDOW_HOURS = config("HN_RANK_WINDOW_HOURS", default=168, cast=int)
+HN_RANK_BATCH_SIZE = config("HN_RANK_BATCH_SIZE", default=5000, cast=int)
+# Postgres advisory lock key held while a sync runs, so only one worker syncs at a time
+HN_SYNC_LOCK_ID = 4804691
+
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'accounts.authentication.CachedJWTAuthentication',
     ],
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.DjangoModelPermissionsOrAnonReadOnly'
     ],
 }
 
+# Seconds an authenticated user stays in the shared cache, and in each process' own cache.
+# Saving a user evicts it from the shared cache; other processes drop their copy when it expires.
+# Users changed with QuerySet.update() or SQL aren't evicted, so keep the first one short
+AUTH_USER_CACHE_SECONDS = config("AUTH_USER_CACHE_SECONDS", default=60, cast=int)
+AUTH_USER_LOCAL_CACHE_SECONDS = config("AUTH_USER_LOCAL_CACHE_SECONDS", default=5, cast=int)
+# last_login is written for many logins at once, at most this many seconds late
+AUTH_LAST_LOGIN_FLUSH_SECONDS = config("AUTH_LAST_LOGIN_FLUSH_SECONDS", default=30, cast=int)
+AUTH_LAST_LOGIN_BATCH_SIZE = config("AUTH_LAST_LOGIN_BATCH_SIZE", default=500, cast=int)
+
 SIMPLE_JWT = {
     "ACCESS_TOKEN_LIFETIME": timedelta(minutes=60),
     "REFRESH_TOKEN_LIFETIME": timedelta(days=7),
@@ -169,4 +221,32 @@ SWAGGER_SETTINGS = {
     }
 }
 
-LOGIN_URL = "/users/login/"
\ No newline at end of file
+LOGIN_URL = "/users/login/"
+
+
+# Logging
+# https://docs.djangoproject.com/en/4.2/topics/logging/
+
+LOGGING = {
+    "version": 1,
+    "disable_existing_loggers": False,
+    "formatters": {
+        "simple": {
+            "format": "{asctime} {levelname} {name}: {message}",
+            "style": "{",
+        },
+    },
+    "handlers": {
+        "console": {
+            "class": "logging.StreamHandler",
+            "formatter": "simple",
+        },
+    },
+    "loggers": {
+        "quickcheck": {
+            "handlers": ["console"],
+            # DEBUG also logs every item fetched during a sync
+            "level": config("LOG_LEVEL", default="INFO"),
+        },
+    },
+}
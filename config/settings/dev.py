@@ -1,3 +1,7 @@
+import tempfile
+
+import dj_database_url
+
 from .base import *
 
 # Database
@@ -13,3 +17,18 @@ DATABASES = {
         'PORT': config("DB_PORT"),
     }
 }
+
+for index, url in enumerate(DATABASE_REPLICA_URLS, start=1):
+    # Tests run against the default database only
+    DATABASES[f"replica{index}"] = {**dj_database_url.parse(url), "TEST": {"MIRROR": "default"}}
+
+# Cache
+# https://docs.djangoproject.com/en/4.2/topics/cache/
+# A file based cache, so the web server sees cache invalidations made by the sync worker
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.path.join(tempfile.gettempdir(), 'quickcheck-cache'),
+    }
+}
@@ -11,3 +11,19 @@ DATABASES = {
         conn_max_age=600
     )
 }
+
+for index, url in enumerate(DATABASE_REPLICA_URLS, start=1):
+    # Tests run against the default database only
+    DATABASES[f"replica{index}"] = {**dj_database_url.parse(url, conn_max_age=600), "TEST": {"MIRROR": "default"}}
+
+# Cache
+# https://docs.djangoproject.com/en/4.2/topics/cache/
+# Shared by all web workers and the sync worker. Defaults to a table in the database
+# (create it with `python manage.py createcachetable`)
+
+CACHES = {
+    'default': {
+        'BACKEND': config("CACHE_BACKEND", default='django.core.cache.backends.db.DatabaseCache'),
+        'LOCATION': config("CACHE_LOCATION", default='quickcheck_cache'),
+    }
+}
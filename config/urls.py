@@ -28,7 +28,9 @@ from quickcheck.views import (
     CommentViewSet,
     PollViewSet,
     PollOptViewSet,
-    AllItemsViewSet
+    AllItemsViewSet,
+    FeedViewSet,
+    metrics,
 )
 from accounts.views import UserViewSet
 
@@ -56,6 +58,7 @@ router.register(r"comments", CommentViewSet, basename="comment")
 router.register(r"polls", PollViewSet, basename="poll")
 router.register(r"pollopts", PollOptViewSet, basename="pollopt")
 router.register(r"all", AllItemsViewSet, basename="all")
+router.register(r"feeds", FeedViewSet, basename="feed")
 
 urlpatterns = [
     path('admin/', admin.site.urls),
@@ -63,5 +66,6 @@ urlpatterns = [
     path('token/refresh/', TokenRefreshView.as_view(), name='token_refresh'),
     path('token/verify/', TokenVerifyView.as_view(), name='token_verify'),
     path("swagger-docs/", schema_view.with_ui('swagger', cache_timeout=0), name='schema-swagger-ui'),
-    path('docs/', schema_view.with_ui('redoc', cache_timeout=0), name='schema-redoc')
+    path('docs/', schema_view.with_ui('redoc', cache_timeout=0), name='schema-redoc'),
+    path('metrics', metrics, name='metrics'),
 ]
@@ -0,0 +1,214 @@
+import json
+import os
+import random
+import statistics
+import threading
+import tempfile
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from django.db import connection, connections
+
+from config.routers import get_replicas
+
+from quickcheck.importer import import_dumps
+from quickcheck.writer import ItemWriter
+
+
+WORDS = (
+    "rust python postgres startup launch show ask hiring remote database index query cache latency "
+    "kernel compiler browser privacy security open source release funding layoffs model inference gpu "
+    "design api protocol network storage benchmark performance memory thread async scheduler editor"
+).split()
+# Made-up words for the long tail of the synthetic texts' vocabulary
+VOCABULARY = WORDS + [
+    first + second + third
+    for first in ["ka", "lo", "mi", "ne", "su", "ta", "vo", "ri"]
+    for second in ["ber", "cal", "dor", "fen", "gil", "hos", "jun", "lex", "mor", "nix"]
+    for third in ["a", "on", "ix", "um", "el", "is", "ar", "os"]
+]
+
+
+class StubHNHandler(BaseHTTPRequestHandler):
+    """
+    Serves a fake Hacker News API. Every item ID up to the server's max_id
+    exists; comments point at the item before them. The last few items are
+    reported in updates.json, with scores that grow by one per revision.
+    """
+
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+
+    def do_GET(self):
+        path = self.path.rsplit("/v0/", 1)[-1]
+        if path == "maxitem.json":
+            payload = self.server.max_id
+        elif path == "updates.json":
+            payload = {"items": self.server.updated_ids, "profiles": []}
+        elif path.startswith("item/") and path.endswith(".json"):
+            payload = self.server.make_item(int(path[len("item/"):-len(".json")]))
+        else:
+            self.send_error(404)
+            return
+
+        if self.server.latency:
+            time.sleep(self.server.latency)
+
+        body = json.dumps(payload).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class StubHNServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, max_id, latency=0.0):
+        super().__init__(("127.0.0.1", 0), StubHNHandler)
+        self.max_id = max_id
+        self.latency = latency
+        self.revision = 0
+        self.thread = threading.Thread(target=self.serve_forever, daemon=True)
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.server_address[1]}/v0"
+
+    @property
+    def updated_ids(self):
+        return list(range(max(self.max_id - 20, 1), self.max_id + 1))
+
+    def make_item(self, item_id):
+        if item_id > self.max_id:
+            return None
+        if item_id % 10 == 0:
+            return {"id": item_id, "type": "story", "by": "bench", "time": 1691830000 + item_id,
+                    "title": f"Story {item_id}", "url": f"https://example.com/{item_id}", "score": item_id % 300 + self.revision,
+                    "descendants": 9}
+        return {"id": item_id, "type": "comment", "by": "bench", "time": 1691830000 + item_id,
+                "parent": item_id - 1, "text": f"Comment {item_id}"}
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.shutdown()
+        self.server_close()
+
+
+def synthetic_items(count, start_id=1, seed=0):
+    """
+    Yields count Hacker News shaped items in ID order: stories with comment
+    trees, some jobs, and polls followed by their pollopts.
+    """
+    rng = random.Random(seed)
+    threads = []
+    item_id = start_id
+    end_id = start_id + count
+
+    def word():
+        # Zipf-like: a few common words, a long tail of rare ones
+        return VOCABULARY[min(int(rng.paretovariate(0.8)) - 1, len(VOCABULARY) - 1)]
+
+    def sentence(low, high):
+        return " ".join(word() for _ in range(rng.randint(low, high)))
+
+    while item_id < end_id:
+        base = {"id": item_id, "by": f"user{rng.randint(1, 5000)}", "time": 1600000000 + item_id}
+        roll = rng.random()
+        if roll < 0.1 or not threads:
+            yield {**base, "type": "story", "title": sentence(3, 10).capitalize(), "url": f"https://example.com/{item_id}",
+                   "score": rng.randint(1, 500), "descendants": rng.randint(0, 200)}
+            threads = (threads + [item_id])[-200:]
+        elif roll < 0.11:
+            yield {**base, "type": "job", "title": sentence(4, 8).capitalize(), "text": sentence(20, 60),
+                   "url": f"https://example.com/jobs/{item_id}"}
+        elif roll < 0.115 and item_id + 3 < end_id:
+            yield {**base, "type": "poll", "title": sentence(3, 8).capitalize(), "text": sentence(10, 30),
+                   "score": rng.randint(1, 300), "descendants": 0}
+            for option in range(1, 4):
+                yield {**base, "id": item_id + option, "type": "pollopt", "parent": item_id, "score": rng.randint(0, 100)}
+            item_id += 3
+        else:
+            parent = rng.choice(threads)
+            yield {**base, "type": "comment", "parent": parent, "text": sentence(5, 80)}
+            threads = (threads + [item_id])[-200:]
+        item_id += 1
+
+
+def seed_items(count, batch_size=2000, seed=0):
+    """
+    Writes count synthetic items through the sync writer. Returns the number
+    of items inserted.
+    """
+    writer = ItemWriter(batch_size=batch_size)
+    for item in synthetic_items(count, seed=seed):
+        writer.add(item)
+    writer.flush()
+    return writer.inserted
+
+
+def import_items(count, workers=None, seed=0):
+    """
+    Bulk loads count synthetic items with the dump importer, which is much
+    faster than the sync writer for large datasets. Returns its metrics.
+    """
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "items.json")
+        with open(path, "w", encoding="utf-8") as dump:
+            for item in synthetic_items(count, seed=seed):
+                dump.write(json.dumps(item) + "\n")
+        return import_dumps([path], workers=workers)
+
+
+@contextmanager
+def scratch_database(keepdb=False):
+    """
+    Runs the block against a freshly migrated test database, so benchmarks
+    never write into the real one. The replicas are pointed at it too, or
+    reads routed to them would see the real data. With keepdb the database
+    (and any data seeded into it) is kept for the next run.
+    """
+    old_name = connection.settings_dict["NAME"]
+    connection.creation.create_test_db(verbosity=0, autoclobber=True, keepdb=keepdb)
+    replicas = {alias: dict(connections[alias].settings_dict) for alias in get_replicas()}
+    for alias in replicas:
+        connections[alias].close()
+        connections[alias].settings_dict.update(connection.settings_dict)
+    try:
+        yield
+    finally:
+        for alias, settings_dict in replicas.items():
+            connections[alias].close()
+            connections[alias].settings_dict.clear()
+            connections[alias].settings_dict.update(settings_dict)
+        connection.creation.destroy_test_db(old_name, verbosity=0, keepdb=keepdb)
+
+
+def timed(func, repeat):
+    """
+    Calls func repeat times and returns the latencies in milliseconds.
+    """
+    latencies = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        latencies.append((time.perf_counter() - start) * 1000)
+    return latencies
+
+
+def summarize(latencies):
+    ordered = sorted(latencies)
+    pick = lambda q: ordered[min(int(q * len(ordered)), len(ordered) - 1)]
+    return {
+        "p50_ms": round(statistics.median(ordered), 3),
+        "p95_ms": round(pick(0.95), 3),
+        "p99_ms": round(pick(0.99), 3),
+    }
@@ -0,0 +1,142 @@
+import datetime
+import hashlib
+import time
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.utils import timezone
+from django.utils.cache import get_conditional_response, quote_etag
+from django.utils.http import http_date
+
+from quickcheck.metrics import record_cache_lookup
+from config.routers import get_replica
+
+
+GENERATION_KEY = "quickcheck:generation"
+MODIFIED_KEY = "quickcheck:generation:modified"
+
+
+def get_generation():
+    """
+    Returns the current data generation. Cached responses are keyed by it,
+    so bumping it invalidates all of them at once.
+    """
+    generation = cache.get(GENERATION_KEY)
+    if generation is None:
+        # Start from the clock, so a counter lost to eviction never goes
+        # back to a generation that still has responses cached
+        cache.add(GENERATION_KEY, int(time.time() * 1000), timeout=None)
+        generation = cache.get(GENERATION_KEY)
+    return generation
+
+
+def bump_generation():
+    """
+    Marks all cached responses stale. Called whenever items are written.
+    """
+    try:
+        cache.incr(GENERATION_KEY)
+    except ValueError:
+        get_generation()
+    cache.set(MODIFIED_KEY, timezone.now(), timeout=None)
+
+
+def replica_may_lag():
+    """
+    Whether this request reads from a replica that may not have replayed the
+    last write yet. What it reads may then predate the current generation.
+    """
+    if get_replica() is None:
+        return False
+    written_at = cache.get(MODIFIED_KEY)
+    lag = datetime.timedelta(seconds=settings.REPLICA_LAG_SECONDS)
+    return written_at is not None and timezone.now() - written_at < lag
+
+
+def cached_response(view_method):
+    """
+    Caches the rendered responses of a viewset action for anonymous users,
+    keyed by the data generation, the response format and the full path.
+    Bypassed while a replica may lag behind the last write.
+    """
+
+    @wraps(view_method)
+    def wrapper(self, request, *args, **kwargs):
+        if request.user.is_authenticated or replica_may_lag():
+            return view_method(self, request, *args, **kwargs)
+
+        key = "quickcheck:response:%s:%s:%s" % (
+            get_generation(),
+            request.accepted_renderer.format,
+            hashlib.md5(request.get_full_path().encode()).hexdigest(),
+        )
+        start = time.perf_counter()
+        cached = cache.get(key)
+        record_cache_lookup(cached is not None, time.perf_counter() - start)
+
+        if cached is not None:
+            content, content_type = cached
+            response = HttpResponse(content, content_type=content_type)
+            response["X-Cache"] = "HIT"
+            return response
+
+        response = view_method(self, request, *args, **kwargs)
+        response["X-Cache"] = "MISS"
+        if response.status_code != 200 or response.streaming:
+            return response
+
+        def store(rendered):
+            cache.set(key, (rendered.content, rendered["Content-Type"]), settings.RESPONSE_CACHE_TIMEOUT)
+
+        if getattr(response, "is_rendered", True):
+            store(response)
+        else:
+            response.add_post_render_callback(store)
+        return response
+
+    return wrapper
+
+
+def conditional_response(get_last_modified=None):
+    """
+    Adds ETag and Last-Modified headers to a viewset action, and answers
+    matching conditional requests with 304 Not Modified before the view runs.
+
+    The ETag combines the data generation, the response format, the full
+    path and get_last_modified(view, request) when given. Last-Modified is
+    the latest of that and the time of the last write. Neither is sent
+    while a replica may lag behind the last write.
+    """
+
+    def decorator(view_method):
+        @wraps(view_method)
+        def wrapper(self, request, *args, **kwargs):
+            if replica_may_lag():
+                return view_method(self, request, *args, **kwargs)
+            last_modified = get_last_modified(self, request) if get_last_modified else None
+            etag = quote_etag(hashlib.md5(("%s:%s:%s:%s" % (
+                get_generation(),
+                request.accepted_renderer.format,
+                request.get_full_path(),
+                last_modified.isoformat() if last_modified else "",
+            )).encode()).hexdigest())
+
+            written_at = cache.get(MODIFIED_KEY)
+            last_modified = max(filter(None, [last_modified, written_at]), default=None)
+            timestamp = int(last_modified.timestamp()) if last_modified else None
+
+            response = get_conditional_response(request, etag=etag, last_modified=timestamp)
+            if response is None:
+                response = view_method(self, request, *args, **kwargs)
+            if response.status_code in (200, 304):
+                response["ETag"] = etag
+                if timestamp is not None:
+                    response["Last-Modified"] = http_date(timestamp)
+            return response
+
+        return wrapper
+
+    return decorator
+
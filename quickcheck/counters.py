@@ -0,0 +1,117 @@
+from django.db import connection
+
+
+# Walks up from each given comment to the root of its tree. Every ancestor
+# gains the comment and everything under it; the direct parent also a kid.
+ADJUST_COUNTS_SQL = """
+    WITH RECURSIVE ancestors AS (
+        SELECT c.parent_id AS id, 1 + b.descendant_count AS weight, 1 AS depth
+        FROM quickcheck_comment AS c
+        JOIN quickcheck_base AS b ON b.id = c.base_ptr_id
+        WHERE c.base_ptr_id = ANY(%s) AND c.parent_id IS NOT NULL
+      UNION ALL
+        SELECT c.parent_id, a.weight, a.depth + 1
+        FROM ancestors AS a
+        JOIN quickcheck_comment AS c ON c.base_ptr_id = a.id
+        WHERE c.parent_id IS NOT NULL
+    ), totals AS (
+        SELECT id, count(*) FILTER (WHERE depth = 1) AS kids, sum(weight) AS descendants
+        FROM ancestors
+        GROUP BY id
+    )
+    UPDATE quickcheck_base AS b SET
+        kid_count = b.kid_count + %s * t.kids,
+        descendant_count = b.descendant_count + %s * t.descendants
+    FROM totals AS t
+    WHERE b.id = t.id
+    RETURNING b.id
+"""
+
+# Recounts every item from scratch, bottom-up one level of the comment trees
+# at a time, so each comment is visited once however deep it is
+RECOUNT_SETUP_SQL = [
+    "DROP TABLE IF EXISTS quickcheck_recount",
+    """
+    CREATE TEMPORARY TABLE quickcheck_recount AS
+    WITH RECURSIVE levels AS (
+        SELECT c.base_ptr_id AS id, c.parent_id, 1 AS depth
+        FROM quickcheck_comment AS c
+        LEFT JOIN quickcheck_comment AS above ON above.base_ptr_id = c.parent_id
+        WHERE above.base_ptr_id IS NULL
+      UNION ALL
+        SELECT c.base_ptr_id, c.parent_id, l.depth + 1
+        FROM levels AS l
+        JOIN quickcheck_comment AS c ON c.parent_id = l.id
+    )
+    SELECT id, parent_id, depth, 0 AS kids, 0 AS descendants FROM levels
+    """,
+    "CREATE INDEX ON quickcheck_recount (id)",
+    "CREATE INDEX ON quickcheck_recount (depth)",
+    "ANALYZE quickcheck_recount",
+]
+
+RECOUNT_LEVEL_SQL = """
+    UPDATE quickcheck_recount AS r SET kids = t.kids, descendants = t.descendants
+    FROM (
+        SELECT parent_id, count(*) AS kids, sum(1 + descendants) AS descendants
+        FROM quickcheck_recount
+        WHERE depth = %s
+        GROUP BY parent_id
+    ) AS t
+    WHERE r.id = t.parent_id
+"""
+
+# Copies the counts into Base, touching only the rows that were off. The
+# parents of top-level comments (stories, polls...) are counted here.
+RECOUNT_SAVE_SQL = """
+    WITH totals AS (
+        SELECT id, kids, descendants FROM quickcheck_recount
+      UNION ALL
+        SELECT parent_id, count(*), sum(1 + descendants)
+        FROM quickcheck_recount
+        WHERE depth = 1 AND parent_id IS NOT NULL
+        GROUP BY parent_id
+    )
+    UPDATE quickcheck_base AS b SET
+        kid_count = COALESCE(t.kids, 0),
+        descendant_count = COALESCE(t.descendants, 0)
+    FROM quickcheck_base AS counted
+    LEFT JOIN totals AS t ON t.id = counted.id
+    WHERE b.id = counted.id
+      AND (b.kid_count, b.descendant_count) IS DISTINCT FROM (COALESCE(t.kids, 0), COALESCE(t.descendants, 0))
+    RETURNING b.id
+"""
+
+
+def add_comments_to_counts(pks, sign=1):
+    """
+    Counts the comments with the given pks, and everything under them, in
+    the kid_count and descendant_count of their ancestors, in one statement.
+    With sign=-1 they are taken out again, e.g. before being deleted.
+    Pks of other item types and of comments without a parent are ignored.
+    Returns the pks of the ancestors whose counts changed.
+    """
+    pks = list(pks)
+    if not pks:
+        return []
+    with connection.cursor() as cursor:
+        cursor.execute(ADJUST_COUNTS_SQL, [pks, sign, sign])
+        return [pk for pk, in cursor.fetchall()]
+
+
+def recount_all():
+    """
+    Recomputes kid_count and descendant_count of every item. Returns the
+    pks of the items whose counts were wrong.
+    """
+    with connection.cursor() as cursor:
+        for sql in RECOUNT_SETUP_SQL:
+            cursor.execute(sql)
+        cursor.execute("SELECT max(depth) FROM quickcheck_recount")
+        max_depth = cursor.fetchone()[0] or 0
+        for depth in range(max_depth, 1, -1):
+            cursor.execute(RECOUNT_LEVEL_SQL, [depth])
+        cursor.execute(RECOUNT_SAVE_SQL)
+        corrected = [pk for pk, in cursor.fetchall()]
+        cursor.execute("DROP TABLE quickcheck_recount")
+        return corrected
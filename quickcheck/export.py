@@ -0,0 +1,115 @@
+import csv
+import json
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import F
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from quickcheck.models import Base
+
+
+# Columns of an exported item, in order. Fields a type doesn't have are null.
+EXPORT_FIELDS = {
+    "id": F("id"),
+    "HN_id": F("HN_id"),
+    "type": F("type"),
+    "by": F("by"),
+    "time": F("time"),
+    "deleted": F("deleted"),
+    "dead": F("dead"),
+    "title": Coalesce("story__title", "job__title", "poll__title"),
+    "url": Coalesce("story__url", "job__url"),
+    "text": Coalesce("job__text", "comment__text", "poll__text"),
+    "score": Coalesce("story__score", "poll__score", "pollopt__score"),
+    "descendants": Coalesce("story__descendants", "poll__descendants"),
+    "parent": Coalesce("comment__parent_id", "pollopt__parent_id"),
+    "parent_HN_id": Coalesce("comment__parent__HN_id", "pollopt__parent__HN_id"),
+    "kid_count": F("kid_count"),
+    "descendant_count": F("descendant_count"),
+}
+
+
+def parse_time(value):
+    """
+    Parses an ISO 8601 date and time, assuming the current time zone when it
+    has none. Raises ValueError for anything else.
+    """
+    time = parse_datetime(value)
+    if time is None:
+        raise ValueError(f"Not an ISO 8601 date and time: {value!r}")
+    if timezone.is_naive(time):
+        time = timezone.make_aware(time)
+    return time
+
+
+def export_rows(item_type=None, since=None, until=None, chunk_size=None):
+    """
+    Yields every item as a tuple of EXPORT_FIELDS values, optionally only
+    those of one type posted in [since, until). Rows are read through a
+    server-side cursor, chunk_size at a time, so memory use stays flat
+    however many items there are.
+    """
+    queryset = Base.objects.all()
+    if item_type:
+        queryset = queryset.filter(type=item_type)
+    if since:
+        queryset = queryset.filter(time__gte=since)
+    if until:
+        queryset = queryset.filter(time__lt=until)
+
+    # Walk the unique index on HN_id rather than sorting the whole table
+    queryset = queryset.order_by("HN_id").values_list(*EXPORT_FIELDS.values())
+    return queryset.iterator(chunk_size=chunk_size or settings.EXPORT_CHUNK_SIZE)
+
+
+def iter_ndjson(rows, lines_per_chunk=500):
+    """
+    Renders rows as newline-delimited JSON, one object per item, joined into
+    chunks of lines_per_chunk lines.
+    """
+    encode = DjangoJSONEncoder(ensure_ascii=False).encode
+    names = list(EXPORT_FIELDS)
+    lines = []
+    for row in rows:
+        lines.append(encode(dict(zip(names, row))))
+        if len(lines) == lines_per_chunk:
+            yield "\n".join(lines) + "\n"
+            lines = []
+    if lines:
+        yield "\n".join(lines) + "\n"
+
+
+class Echo:
+    """
+    A file-like object that hands back what is written to it, so csv.writer
+    can render rows one at a time.
+    """
+
+    def write(self, value):
+        return value
+
+
+def iter_csv(rows, lines_per_chunk=500):
+    """
+    Renders rows as CSV with a header line, in chunks of lines_per_chunk
+    lines. Nulls are empty fields and times are ISO 8601.
+    """
+    writer = csv.writer(Echo())
+    lines = [writer.writerow(EXPORT_FIELDS)]
+    for row in rows:
+        lines.append(writer.writerow(value.isoformat() if hasattr(value, "isoformat") else value for value in row))
+        if len(lines) == lines_per_chunk:
+            yield "".join(lines)
+            lines = []
+    if lines:
+        yield "".join(lines)
+
+
+# Export formats, with the function rendering them and their content type
+EXPORT_FORMATS = {
+    "ndjson": (iter_ndjson, "application/x-ndjson"),
+    "csv": (iter_csv, "text/csv"),
+}
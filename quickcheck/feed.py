@@ -0,0 +1,99 @@
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from django.db import connection
+
+
+REFRESH_FEED_SQL = """
+    INSERT INTO quickcheck_itemfeed (
+        item_id, "HN_id", type, by, time, title, url, score, descendants, "parent_HN_id", kid_count,
+        descendant_count, search_vector
+    )
+    SELECT
+        b.id, b."HN_id", b.type, b.by, b.time,
+        COALESCE(s.title, j.title, p.title),
+        COALESCE(s.url, j.url),
+        COALESCE(s.score, p.score, o.score),
+        COALESCE(s.descendants, p.descendants),
+        parent."HN_id",
+        b.kid_count,
+        b.descendant_count,
+        setweight(to_tsvector('english', COALESCE(s.title, j.title, p.title, '')), 'A')
+            || setweight(to_tsvector('english', COALESCE(j.text, p.text, c.text, '')), 'B')
+    FROM quickcheck_base AS b
+    LEFT JOIN quickcheck_story AS s ON s.base_ptr_id = b.id
+    LEFT JOIN quickcheck_job AS j ON j.base_ptr_id = b.id
+    LEFT JOIN quickcheck_poll AS p ON p.base_ptr_id = b.id
+    LEFT JOIN quickcheck_comment AS c ON c.base_ptr_id = b.id
+    LEFT JOIN quickcheck_pollopt AS o ON o.base_ptr_id = b.id
+    LEFT JOIN quickcheck_base AS parent ON parent.id = COALESCE(c.parent_id, o.parent_id)
+    %s
+    ON CONFLICT (item_id) DO UPDATE SET
+        "HN_id" = EXCLUDED."HN_id",
+        type = EXCLUDED.type,
+        by = EXCLUDED.by,
+        time = EXCLUDED.time,
+        title = EXCLUDED.title,
+        url = EXCLUDED.url,
+        score = EXCLUDED.score,
+        descendants = EXCLUDED.descendants,
+        "parent_HN_id" = EXCLUDED."parent_HN_id",
+        kid_count = EXCLUDED.kid_count,
+        descendant_count = EXCLUDED.descendant_count,
+        search_vector = EXCLUDED.search_vector
+"""
+
+
+def refresh_feed(pks=None):
+    """
+    Rebuilds the ItemFeed rows of the given items and of their parents,
+    whose kid counts they affect. Counts are copied from Base, so they
+    must be adjusted before the feed is refreshed. Rebuilds every row when pks is None.
+    """
+    with connection.cursor() as cursor:
+        if pks is None:
+            cursor.execute(REFRESH_FEED_SQL % "")
+            return
+        pks = list(pks)
+        if not pks:
+            return
+        cursor.execute(
+            REFRESH_FEED_SQL % """
+                WHERE b.id = ANY(%s) OR b.id IN (
+                    SELECT parent_id FROM quickcheck_comment WHERE base_ptr_id = ANY(%s)
+                    UNION SELECT parent_id FROM quickcheck_pollopt WHERE base_ptr_id = ANY(%s)
+                )
+            """,
+            [pks, pks, pks],
+        )
+
+
+def refresh_feed_slice(low, high=None):
+    """
+    Rebuilds the ItemFeed rows of the items with low <= pk < high on this
+    thread's own connection, which is closed afterwards.
+    """
+    try:
+        with connection.cursor() as cursor:
+            if high is None:
+                cursor.execute(REFRESH_FEED_SQL % "WHERE b.id >= %s", [low])
+            else:
+                cursor.execute(REFRESH_FEED_SQL % "WHERE b.id >= %s AND b.id < %s", [low, high])
+    finally:
+        connection.close()
+
+
+def rebuild_feed(workers=1):
+    """
+    Rebuilds every ItemFeed row, with the pk range split between workers
+    threads, each on its own connection, so Postgres builds the search
+    vectors on as many cores. Only sees committed items.
+    """
+    bounds = [uuid.UUID(int=i * 2**128 // workers) for i in range(workers)] + [None]
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        slices = [executor.submit(refresh_feed_slice, low, high) for low, high in zip(bounds, bounds[1:])]
+        for future in slices:
+            future.result()
+    # The planner's statistics still describe the feed before the rebuild
+    with connection.cursor() as cursor:
+        cursor.execute("ANALYZE quickcheck_itemfeed")
@@ -0,0 +1,89 @@
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from django.conf import settings
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from quickcheck.metrics import HN_REQUEST_ERRORS, HN_REQUEST_SECONDS
+
+
+class ItemFetcher:
+    """
+    Fetches items from the Hacker News API concurrently over a shared
+    keep-alive session. Items are always handed back in ID order so
+    parents are written before the comments that point at them.
+    """
+
+    def __init__(self, base_url=None, concurrency=None, timeout=None):
+        self.base_url = base_url or settings.HACKER_NEWS_API_URL
+        self.concurrency = concurrency or settings.HN_SYNC_CONCURRENCY
+        self.timeout = timeout or settings.HN_SYNC_TIMEOUT
+
+        retry = Retry(total=3, backoff_factor=0.5, status_forcelist=[500, 502, 503, 504])
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.concurrency, max_retries=retry)
+        self.session = requests.Session()
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.executor = ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix="hn-fetch")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        self.executor.shutdown(wait=True)
+        self.session.close()
+
+    def get_json(self, path):
+        # "item/123.json" is timed as "item", so the endpoints stay few
+        endpoint = path.split("/", 1)[0].split(".", 1)[0]
+        start = time.perf_counter()
+        try:
+            response = self.session.get(f"{self.base_url}/{path}", timeout=self.timeout)
+            response.raise_for_status()
+            return response.json()
+        except Exception:
+            HN_REQUEST_ERRORS.inc(endpoint=endpoint)
+            raise
+        finally:
+            HN_REQUEST_SECONDS.observe(time.perf_counter() - start, endpoint=endpoint)
+
+    def fetch_max_item(self):
+        return self.get_json("maxitem.json")
+
+    def fetch_item(self, item_id):
+        return self.get_json(f"item/{item_id}.json")
+
+    def fetch_items(self, item_ids):
+        """
+        Yields (item_id, item) pairs in the order of item_ids. At most a few
+        windows' worth of requests are in flight at once, so memory stays
+        bounded however long the range is. item is None for IDs HN has no
+        data for.
+        """
+        item_ids = iter(item_ids)
+        window = deque()
+        max_pending = self.concurrency * 2
+
+        def submit_next():
+            for item_id in item_ids:
+                window.append((item_id, self.executor.submit(self.fetch_item, item_id)))
+                return True
+            return False
+
+        try:
+            while len(window) < max_pending and submit_next():
+                pass
+            while window:
+                item_id, future = window.popleft()
+                item = future.result()
+                submit_next()
+                yield item_id, item
+        finally:
+            for _, future in window:
+                future.cancel()
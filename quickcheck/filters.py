@@ -0,0 +1,23 @@
+from django.contrib.postgres.search import SearchQuery, SearchRank
+from django.db.models import F
+from rest_framework.filters import SearchFilter
+
+
+class FullTextSearchFilter(SearchFilter):
+    """
+    Full-text search over the search_vector of the item feed, served by its
+    GIN index. Accepts web search syntax ("quoted phrases", -excluded words,
+    or) and orders the results by relevance, newest first on ties.
+    """
+
+    def filter_queryset(self, request, queryset, view):
+        terms = request.query_params.get(self.search_param, "").strip()
+        if not terms or not any(field.name == "search_vector" for field in queryset.model._meta.fields):
+            return queryset
+
+        query = SearchQuery(terms, config="english", search_type="websearch")
+        return (
+            queryset.filter(search_vector=query)
+            .annotate(rank=SearchRank(F("search_vector"), query))
+            .order_by("-rank", "-time")
+        )
@@ -0,0 +1,227 @@
+import csv
+import gzip
+import io
+import itertools
+import json
+import os
+import time
+import uuid
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import django
+from django.db import connection, transaction
+
+from quickcheck.cache import bump_generation
+from quickcheck.counters import recount_all
+from quickcheck.feed import rebuild_feed
+from quickcheck.writer import ITEM_MODELS, link_pending_parents
+
+
+# Columns of the staging table, in the order parse_lines writes them
+STAGING_COLUMNS = [
+    "id", "HN_id", "type", "by", "time", "deleted", "dead",
+    "title", "url", "text", "score", "descendants", "parent_HN_id",
+]
+
+CREATE_STAGING_SQL = """
+    CREATE TEMPORARY TABLE IF NOT EXISTS quickcheck_import (
+        id uuid, "HN_id" integer, type text, by text, time bigint, deleted boolean, dead boolean,
+        title text, url text, text text, score integer, descendants integer, "parent_HN_id" integer
+    )
+"""
+
+# Moves the staged items into the item tables. Base rows clashing on HN_id
+# are skipped, and child rows are only written for the base rows that were
+# inserted. Parents already stored are linked here; the rest are queued in
+# PendingParent like the sync writer does.
+MOVE_STAGED_SQL = [
+    """
+    INSERT INTO quickcheck_base (id, "HN_id", type, by, time, deleted, dead, kid_count, descendant_count)
+    SELECT id, "HN_id", type, left(by, 255), to_timestamp(time), COALESCE(deleted, false), COALESCE(dead, false), 0, 0
+    FROM quickcheck_import
+    ON CONFLICT ("HN_id") DO NOTHING
+    """,
+    """
+    INSERT INTO quickcheck_story (base_ptr_id, descendants, score, title, url)
+    SELECT s.id, s.descendants, s.score, left(s.title, 255), left(s.url, 500)
+    FROM quickcheck_import AS s JOIN quickcheck_base AS b ON b.id = s.id
+    WHERE s.type = 'story'
+    """,
+    """
+    INSERT INTO quickcheck_job (base_ptr_id, text, title, url)
+    SELECT s.id, s.text, left(s.title, 255), left(s.url, 500)
+    FROM quickcheck_import AS s JOIN quickcheck_base AS b ON b.id = s.id
+    WHERE s.type = 'job'
+    """,
+    """
+    INSERT INTO quickcheck_poll (base_ptr_id, descendants, score, title, text)
+    SELECT s.id, s.descendants, s.score, left(s.title, 255), s.text
+    FROM quickcheck_import AS s JOIN quickcheck_base AS b ON b.id = s.id
+    WHERE s.type = 'poll'
+    """,
+    """
+    INSERT INTO quickcheck_comment (base_ptr_id, parent_id, text)
+    SELECT s.id, parent.id, s.text
+    FROM quickcheck_import AS s
+    JOIN quickcheck_base AS b ON b.id = s.id
+    LEFT JOIN quickcheck_base AS parent ON parent."HN_id" = s."parent_HN_id"
+    WHERE s.type = 'comment'
+    """,
+    """
+    INSERT INTO quickcheck_pollopt (base_ptr_id, parent_id, score)
+    SELECT s.id, poll.base_ptr_id, s.score
+    FROM quickcheck_import AS s
+    JOIN quickcheck_base AS b ON b.id = s.id
+    LEFT JOIN quickcheck_base AS parent ON parent."HN_id" = s."parent_HN_id"
+    LEFT JOIN quickcheck_poll AS poll ON poll.base_ptr_id = parent.id
+    WHERE s.type = 'pollopt'
+    """,
+    """
+    INSERT INTO quickcheck_pendingparent (item_id, "parent_HN_id")
+    SELECT s.id, s."parent_HN_id"
+    FROM quickcheck_import AS s
+    JOIN quickcheck_base AS b ON b.id = s.id
+    LEFT JOIN quickcheck_base AS parent ON parent."HN_id" = s."parent_HN_id"
+    WHERE s.type IN ('comment', 'pollopt') AND s."parent_HN_id" IS NOT NULL AND parent.id IS NULL
+    """,
+    "TRUNCATE quickcheck_import",
+]
+
+
+def read_lines(paths):
+    """
+    Yields the lines of NDJSON dumps one after the other, gunzipping those
+    whose name ends in .gz on the fly.
+    """
+    for path in paths:
+        opener = gzip.open if path.endswith(".gz") else open
+        with opener(path, "rt", encoding="utf-8") as dump:
+            yield from dump
+
+
+def parse_lines(lines):
+    """
+    Parses lines of Hacker News items as the API returns them into CSV rows
+    for the staging table. Blank lines, nulls and item types we don't store
+    are skipped. Runs in a worker process, so it doesn't touch Django.
+    Returns the CSV and the number of rows in it.
+    """
+    out = io.StringIO()
+    writer = csv.writer(out)
+    rows = 0
+    for line in lines:
+        line = line.strip()
+        if not line:
+            continue
+        item = json.loads(line)
+        if not item or item.get("type") not in ITEM_MODELS:
+            continue
+        row = [
+            uuid.uuid4(), item["id"], item["type"], item.get("by"), item.get("time"),
+            item.get("deleted"), item.get("dead"), item.get("title"), item.get("url"), item.get("text"),
+            item.get("score"), item.get("descendants"), item.get("parent"),
+        ]
+        writer.writerow([
+            "t" if value is True else "f" if value is False
+            # Postgres text can't hold NUL characters
+            else value.replace("\x00", "") if isinstance(value, str)
+            else value
+            for value in row
+        ])
+        rows += 1
+    return out.getvalue(), rows
+
+
+def parse_dumps(paths, workers, chunk_lines):
+    """
+    Yields (csv, rows) for every chunk_lines lines of the dumps, in order,
+    parsed by a pool of worker processes. At most a couple of chunks per
+    worker are in flight, so memory stays bounded however big the dumps are.
+    """
+    lines = read_lines(paths)
+    chunks = iter(lambda: list(itertools.islice(lines, chunk_lines)), [])
+    window = deque()
+
+    # Workers unpickle parse_lines by importing this module, which needs
+    # Django set up where processes are spawned rather than forked
+    with ProcessPoolExecutor(max_workers=workers, initializer=django.setup) as executor:
+        try:
+            for chunk in itertools.islice(chunks, workers * 2):
+                window.append(executor.submit(parse_lines, chunk))
+            while window:
+                result = window.popleft().result()
+                for chunk in itertools.islice(chunks, 1):
+                    window.append(executor.submit(parse_lines, chunk))
+                yield result
+        finally:
+            for future in window:
+                future.cancel()
+
+
+def load_staged(cursor, parsed, batch_size):
+    """
+    COPYs parsed CSV chunks into the staging table as they arrive, until
+    batch_size items are staged or parsed runs out, then moves them into the
+    item tables. Returns the number of items staged and inserted.
+    """
+    qn = connection.ops.quote_name
+    copy_sql = "COPY quickcheck_import (%s) FROM STDIN WITH (FORMAT csv)" % ", ".join(map(qn, STAGING_COLUMNS))
+    staged = 0
+    for data, rows in parsed:
+        cursor.copy_expert(copy_sql, io.StringIO(data))
+        staged += rows
+        if staged >= batch_size:
+            break
+
+    cursor.execute(MOVE_STAGED_SQL[0])
+    inserted = cursor.rowcount
+    for sql in MOVE_STAGED_SQL[1:]:
+        cursor.execute(sql)
+    return staged, inserted
+
+
+def import_dumps(paths, workers=None, chunk_lines=20000, batch_size=500000):
+    """
+    Loads gzipped (or plain) NDJSON dumps of Hacker News items into the item
+    tables. Items whose HN_id is already stored are skipped. Lines are parsed
+    in worker processes and loaded with COPY, one transaction per batch_size
+    items. Parents are linked set-based, and once everything is loaded the
+    counts are recomputed and the feed is rebuilt by workers connections.
+    Returns a dict of metrics.
+    """
+    workers = workers or os.cpu_count()
+    metrics = {"read": 0, "inserted": 0}
+    start = time.perf_counter()
+
+    with connection.cursor() as cursor:
+        cursor.execute(CREATE_STAGING_SQL)
+        cursor.execute("TRUNCATE quickcheck_import")
+        # Chunks are copied as they are parsed, so only the staging table holds a batch
+        parsed = parse_dumps(paths, workers, chunk_lines)
+        staged = batch_size
+        while staged >= batch_size:
+            with transaction.atomic():
+                staged, inserted = load_staged(cursor, parsed, batch_size)
+            metrics["read"] += staged
+            metrics["inserted"] += inserted
+        metrics["load_seconds"] = time.perf_counter() - start
+
+        # The planner's statistics still describe the tables before the load
+        cursor.execute(
+            "ANALYZE quickcheck_base, quickcheck_story, quickcheck_job, quickcheck_comment, "
+            "quickcheck_poll, quickcheck_pollopt, quickcheck_pendingparent"
+        )
+        # Dumps needn't be in ID order, so link the items whose parent came later
+        with transaction.atomic():
+            metrics["linked"] = len(link_pending_parents(cursor))
+            recount_all()
+        cursor.execute("DROP TABLE quickcheck_import")
+    metrics["count_seconds"] = time.perf_counter() - start - metrics["load_seconds"]
+
+    rebuild_feed(workers)
+
+    if metrics["inserted"]:
+        bump_generation()
+    metrics["seconds"] = time.perf_counter() - start
+    return metrics
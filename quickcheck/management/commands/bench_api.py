@@ -0,0 +1,132 @@
+import json
+import statistics
+import subprocess
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test import Client
+from django.test.utils import override_settings
+
+from quickcheck.bench import import_items, scratch_database, summarize
+from quickcheck.models import Base
+
+
+# Each endpoint is requested over and over, so with the response cache on nearly every
+# request is a hit. It's off unless --cache is given, and never shared with a running server
+BENCH_CACHES = {"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}}
+NO_CACHES = {"default": {"BACKEND": "django.core.cache.backends.dummy.DummyCache"}}
+
+JSON = "application/json"
+HTML = "text/html"
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmarks the read API in-process on a synthetic dataset, in a scratch database, and prints the "
+        "latency percentiles, queries per request and throughput of each endpoint as JSON."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--items", type=int, default=1000000, help="Number of items to seed.")
+        parser.add_argument("--requests", type=int, default=200, help="Timed requests per endpoint.")
+        parser.add_argument("--warmup", type=int, default=10, help="Untimed requests per endpoint first.")
+        parser.add_argument("--deep-pages", type=int, default=100, help="How many pages deep the deep page requests go.")
+        parser.add_argument("--search", nargs="+", default=["postgres", "kaberon", "python kernel"], help="Search terms.")
+        parser.add_argument("--seed", type=int, default=0, help="Seed of the synthetic dataset.")
+        parser.add_argument("--workers", type=int, default=None, help="Processes loading the dataset.")
+        parser.add_argument("--cache", action="store_true", help="Enable the response cache.")
+        parser.add_argument("--keepdb", action="store_true", help="Keep the seeded database for the next run.")
+        parser.add_argument("--output", help="Also write the results to this file.")
+
+    def handle(self, *args, **options):
+        caches = BENCH_CACHES if options["cache"] else NO_CACHES
+        with scratch_database(keepdb=options["keepdb"]), override_settings(
+            ALLOWED_HOSTS=["testserver"], CACHES=caches, PROFILE_SAMPLE_RATE=0
+        ):
+            if not Base.objects.exists():
+                self.stdout.write(f"Seeding {options['items']} items...")
+                import_items(options["items"], workers=options["workers"], seed=options["seed"])
+
+            client = Client()
+            results = {
+                "commit": self.get_commit(),
+                "items": Base.objects.count(),
+                "cache": options["cache"],
+                "requests": options["requests"],
+                "endpoints": {},
+            }
+            for name, urls, accept in self.get_endpoints(client, options):
+                self.stdout.write(f"Benchmarking {name}...")
+                results["endpoints"][name] = self.run(client, urls, accept, options["warmup"], options["requests"])
+
+        output = json.dumps(results, indent=2)
+        if options["output"]:
+            with open(options["output"], "w") as file:
+                file.write(output + "\n")
+        self.stdout.write(output)
+
+    def get_commit(self):
+        try:
+            return subprocess.run(
+                ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+            ).stdout.strip()
+        except (OSError, subprocess.CalledProcessError):
+            return None
+
+    def get_endpoints(self, client, options):
+        """
+        (name, urls, Accept header) of each endpoint benchmarked. Requests
+        cycle through the urls; the items are picked reproducibly.
+        """
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT setseed(0.5)")
+            cursor.execute("SELECT id FROM quickcheck_base WHERE type = 'story' ORDER BY random() LIMIT 100")
+            story_ids = [pk for pk, in cursor.fetchall()]
+
+        # Follow the cursor links, like a client paging through everything
+        url = "/all/"
+        for _ in range(options["deep_pages"]):
+            next_url = client.get(url, HTTP_ACCEPT=JSON).json()["next"]
+            if not next_url:
+                break
+            url = next_url.split("://testserver", 1)[-1]
+
+        return [
+            ("all", ["/all/"], JSON),
+            ("all_stories", ["/all/?type=story"], JSON),
+            ("all_html", ["/all/"], HTML),
+            ("item", [f"/all/{pk}/" for pk in story_ids], HTML),
+            ("stories", ["/stories/"], JSON),
+            ("search", [f"/all/?search={term}" for term in options["search"]], JSON),
+            ("deep_page_cursor", [url], JSON),
+            ("deep_page_number", [f"/all/?page={options['deep_pages']}"], JSON),
+        ]
+
+    def run(self, client, urls, accept, warmup, repeat):
+        queries = 0
+
+        def count_query(execute, sql, params, many, context):
+            nonlocal queries
+            queries += 1
+            return execute(sql, params, many, context)
+
+        for i in range(warmup):
+            client.get(urls[i % len(urls)], HTTP_ACCEPT=accept)
+
+        latencies, query_counts, errors = [], [], 0
+        for i in range(repeat):
+            queries = 0
+            start = time.perf_counter()
+            with connection.execute_wrapper(count_query):
+                response = client.get(urls[i % len(urls)], HTTP_ACCEPT=accept)
+            latencies.append((time.perf_counter() - start) * 1000)
+            query_counts.append(queries)
+            errors += response.status_code != 200
+
+        return {
+            **summarize(latencies),
+            "queries_per_request": round(statistics.mean(query_counts), 2),
+            "requests_per_second": round(len(latencies) / sum(latencies) * 1000, 1),
+            "errors": errors,
+        }
@@ -0,0 +1,44 @@
+import gzip
+import json
+import os
+import tempfile
+
+from django.core.management.base import BaseCommand
+
+from quickcheck.bench import scratch_database, synthetic_items
+from quickcheck.importer import import_dumps
+from quickcheck.models import Base, PendingParent
+
+
+class Command(BaseCommand):
+    help = "Measures how many items per minute hn_import loads from a synthetic gzipped dump, in a scratch database."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--items", type=int, default=1000000, help="Number of items in the dump.")
+        parser.add_argument("--workers", type=int, default=os.cpu_count(), help="Processes parsing the dump.")
+        parser.add_argument("--chunk-lines", type=int, default=20000, help="Lines per parsing job.")
+        parser.add_argument("--batch-size", type=int, default=500000, help="Items loaded per transaction.")
+
+    def handle(self, *args, **options):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "items.json.gz")
+            self.stdout.write(f"Writing a dump of {options['items']} items...")
+            with gzip.open(path, "wt", encoding="utf-8", compresslevel=1) as dump:
+                for item in synthetic_items(options["items"]):
+                    dump.write(json.dumps(item) + "\n")
+            dump_mb = round(os.path.getsize(path) / 2**20, 1)
+
+            with scratch_database():
+                metrics = import_dumps(
+                    [path],
+                    workers=options["workers"],
+                    chunk_lines=options["chunk_lines"],
+                    batch_size=options["batch_size"],
+                )
+                metrics["stored"] = Base.objects.count()
+                metrics["pending_parents"] = PendingParent.objects.count()
+
+        metrics["dump_mb"] = dump_mb
+        metrics["items_per_minute"] = round(metrics["read"] / metrics["seconds"] * 60)
+        metrics["load_items_per_minute"] = round(metrics["read"] / metrics["load_seconds"] * 60)
+        self.stdout.write(json.dumps(metrics, indent=2))
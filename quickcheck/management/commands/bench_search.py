@@ -0,0 +1,48 @@
+import json
+
+from django.core.management.base import BaseCommand
+from rest_framework.filters import SearchFilter
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+
+from quickcheck.bench import scratch_database, seed_items, summarize, timed
+from quickcheck.filters import FullTextSearchFilter
+from quickcheck.models import Base, ItemFeed
+
+
+class LegacySearchView:
+    # The search AllItemsViewSet used before full-text search
+    search_fields = ["job__title", "job__text", "story__title", "poll__title", "poll__text"]
+
+
+class Command(BaseCommand):
+    help = (
+        "Compares full-text search on the item feed with the old ILIKE SearchFilter "
+        "on a synthetic dataset, in a scratch database."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--items", type=int, default=1000000, help="Number of items to seed.")
+        parser.add_argument("--repeat", type=int, default=20, help="Searches per term and backend.")
+        parser.add_argument("--terms", nargs="+", default=["postgres", "kaberon", "python kernel"])
+        parser.add_argument("--keepdb", action="store_true", help="Keep the seeded database for the next run.")
+
+    def handle(self, *args, **options):
+        with scratch_database(keepdb=options["keepdb"]):
+            if not Base.objects.exists():
+                self.stdout.write(f"Seeding {options['items']} items...")
+                seed_items(options["items"])
+
+            results = {"items": Base.objects.count(), "terms": {}}
+            for term in options["terms"]:
+                request = Request(APIRequestFactory().get("/all/", {"search": term}))
+                legacy = SearchFilter().filter_queryset(request, Base.objects.all(), LegacySearchView())
+                fulltext = FullTextSearchFilter().filter_queryset(request, ItemFeed.objects.all(), None)
+
+                # What a first page costs: the page itself plus its count
+                results["terms"][term] = {
+                    "search_filter": summarize(timed(lambda: (list(legacy[:20]), legacy.count()), options["repeat"])),
+                    "full_text": summarize(timed(lambda: (list(fulltext[:20]), fulltext.count()), options["repeat"])),
+                }
+
+        self.stdout.write(json.dumps(results, indent=2))
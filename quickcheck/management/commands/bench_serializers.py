@@ -0,0 +1,48 @@
+import json
+
+from django.core.management.base import BaseCommand
+from rest_framework.renderers import JSONRenderer
+
+from config.renderers import ORJSONRenderer
+from quickcheck.bench import scratch_database, seed_items, summarize, timed
+from quickcheck.models import Base
+from quickcheck.serializers import AllItemsSerializer, ItemRowSerializer
+from quickcheck.views import AllItemsViewSet
+
+
+class Command(BaseCommand):
+    help = (
+        "Times turning 1,000 items into JSON with AllItemsSerializer and JSONRenderer, and with the "
+        "values()-based ItemRowSerializer and ORJSONRenderer, in a scratch database."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--items", type=int, default=20000, help="Number of items to seed.")
+        parser.add_argument("--repeat", type=int, default=20, help="Runs per serializer.")
+        parser.add_argument("--keepdb", action="store_true", help="Keep the seeded database for the next run.")
+
+    def handle(self, *args, **options):
+        with scratch_database(keepdb=options["keepdb"]):
+            if not Base.objects.exists():
+                self.stdout.write(f"Seeding {options['items']} items...")
+                seed_items(options["items"])
+            pks = list(Base.objects.order_by("-time").values_list("id", flat=True)[:1000])
+
+            def drf():
+                items = AllItemsViewSet().get_items_queryset().in_bulk(pks)
+                return JSONRenderer().render(AllItemsSerializer([items[pk] for pk in pks], many=True).data)
+
+            def fast():
+                return ORJSONRenderer().render(ItemRowSerializer().serialize(pks))
+
+            if drf() != fast():
+                self.stderr.write("The two serializers disagree!")
+
+            # Everything a list page does per item: queries, serializing, rendering
+            results = {
+                "items": len(pks),
+                "drf_per_1000": summarize(timed(drf, options["repeat"])),
+                "fast_per_1000": summarize(timed(fast, options["repeat"])),
+            }
+
+        self.stdout.write(json.dumps(results, indent=2))
@@ -0,0 +1,28 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from quickcheck.bench import StubHNServer
+from quickcheck.fetcher import ItemFetcher
+
+
+class Command(BaseCommand):
+    help = "Benchmarks the concurrent Hacker News fetcher against a local stub server."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--items", type=int, default=2000, help="Number of items to fetch per run.")
+        parser.add_argument("--latency-ms", type=float, default=20, help="Simulated per-request latency.")
+        parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 8, 32, 128])
+
+    def handle(self, *args, **options):
+        items = options["items"]
+        with StubHNServer(max_id=items, latency=options["latency_ms"] / 1000) as server:
+            for concurrency in options["concurrency"]:
+                with ItemFetcher(base_url=server.url, concurrency=concurrency) as fetcher:
+                    start = time.perf_counter()
+                    fetched = sum(1 for _, item in fetcher.fetch_items(range(1, items + 1)) if item)
+                    elapsed = time.perf_counter() - start
+                self.stdout.write(
+                    f"concurrency={concurrency:<4} items={fetched:<6} "
+                    f"seconds={elapsed:.2f} items/sec={fetched / elapsed:.1f}"
+                )
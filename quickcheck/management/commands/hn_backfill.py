@@ -0,0 +1,61 @@
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import django
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+from quickcheck.models import BackfillShard
+from quickcheck.sync import backfill_shard, link_all_pending_parents
+
+
+def init_worker():
+    django.setup()
+    connections.close_all()
+
+
+def run_shard(shard_id, concurrency):
+    shard = BackfillShard.objects.get(pk=shard_id)
+    return str(shard), backfill_shard(shard, concurrency=concurrency)
+
+
+class Command(BaseCommand):
+    help = (
+        "Backfills a range of historical Hacker News items with a pool of worker processes. "
+        "Progress is checkpointed per shard, so re-running the same command resumes where it stopped."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--from", dest="from_id", type=int, required=True, help="First HN id to fetch.")
+        parser.add_argument("--to", dest="to_id", type=int, required=True, help="Last HN id to fetch.")
+        parser.add_argument("--workers", type=int, default=4, help="Number of worker processes.")
+        parser.add_argument("--shard-size", type=int, default=10000, help="Number of HN ids per shard.")
+        parser.add_argument("--concurrency", type=int, default=None, help="Parallel requests per worker.")
+
+    def handle(self, *args, **options):
+        from_id, to_id, shard_size = options["from_id"], options["to_id"], options["shard_size"]
+        if from_id > to_id:
+            raise CommandError("--from must not be greater than --to.")
+
+        for start in range(from_id, to_id + 1, shard_size):
+            BackfillShard.objects.get_or_create(
+                start_HN_id=start,
+                end_HN_id=min(start + shard_size - 1, to_id),
+                defaults={"next_HN_id": start},
+            )
+        shard_ids = list(
+            BackfillShard.objects.filter(start_HN_id__gte=from_id, end_HN_id__lte=to_id, done=False)
+            .order_by("start_HN_id")
+            .values_list("id", flat=True)
+        )
+        self.stdout.write(f"{len(shard_ids)} shards to backfill.")
+
+        # Worker processes must not share the parent's database connections
+        connections.close_all()
+        with ProcessPoolExecutor(max_workers=options["workers"], initializer=init_worker) as pool:
+            futures = [pool.submit(run_shard, shard_id, options["concurrency"]) for shard_id in shard_ids]
+            for future in as_completed(futures):
+                shard, inserted = future.result()
+                self.stdout.write(f"Backfilled {shard}: {inserted} items inserted.")
+
+        linked = link_all_pending_parents()
+        self.stdout.write(self.style.SUCCESS(f"Backfill done, linked {linked} items to their parents."))
@@ -0,0 +1,47 @@
+import gzip
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from quickcheck.export import EXPORT_FORMATS, export_rows, parse_time
+from quickcheck.models import Base
+
+
+class Command(BaseCommand):
+    help = (
+        "Exports items as NDJSON or CSV to a file (gzipped if it ends in .gz) or stdout. Rows are "
+        "streamed from a server-side cursor, so memory use doesn't grow with the table."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--output", choices=list(EXPORT_FORMATS), default="ndjson", help="Export format.")
+        parser.add_argument("--type", choices=[name for name, _ in Base.TYPE_CHOICES], help="Only export this type.")
+        parser.add_argument("--since", help="Only export items posted at or after this ISO 8601 time.")
+        parser.add_argument("--until", help="Only export items posted before this ISO 8601 time.")
+        parser.add_argument("--chunk-size", type=int, help="Rows fetched per round trip.")
+        parser.add_argument("--file", help="Write to this file instead of stdout.")
+
+    def handle(self, *args, **options):
+        times = {}
+        for name in ["since", "until"]:
+            try:
+                times[name] = parse_time(options[name]) if options[name] else None
+            except ValueError as error:
+                raise CommandError(error)
+
+        render_rows = EXPORT_FORMATS[options["output"]][0]
+        rows = export_rows(options["type"], chunk_size=options["chunk_size"], **times)
+
+        path = options["file"]
+        if path is None:
+            out = sys.stdout
+        elif path.endswith(".gz"):
+            out = gzip.open(path, "wt", encoding="utf-8", newline="")
+        else:
+            out = open(path, "w", encoding="utf-8", newline="")
+        try:
+            for chunk in render_rows(rows):
+                out.write(chunk)
+        finally:
+            if out is not sys.stdout:
+                out.close()
@@ -0,0 +1,40 @@
+import json
+import os
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from quickcheck.importer import import_dumps
+from quickcheck.sync import advisory_lock
+
+
+class Command(BaseCommand):
+    help = (
+        "Loads NDJSON dumps of Hacker News items (one item per line, as the API returns them, gzipped if "
+        "the name ends in .gz) with COPY. Items already stored are skipped. Refuses to run while a sync is running."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("paths", nargs="+", help="Dump files, loaded in order.")
+        parser.add_argument("--workers", type=int, default=os.cpu_count(), help="Processes parsing the dumps.")
+        parser.add_argument("--chunk-lines", type=int, default=20000, help="Lines per parsing job.")
+        parser.add_argument("--batch-size", type=int, default=500000, help="Items loaded per transaction.")
+
+    def handle(self, *args, **options):
+        for path in options["paths"]:
+            if not os.path.isfile(path):
+                raise CommandError(f"No such file: {path}")
+
+        # Counts and the feed are rebuilt at the end, which a sync would race
+        with advisory_lock(settings.HN_SYNC_LOCK_ID) as acquired:
+            if not acquired:
+                raise CommandError("A sync is running, try again once it's done.")
+            metrics = import_dumps(
+                options["paths"],
+                workers=options["workers"],
+                chunk_lines=options["chunk_lines"],
+                batch_size=options["batch_size"],
+            )
+
+        metrics["items_per_minute"] = round(metrics["read"] / metrics["seconds"] * 60)
+        self.stdout.write(json.dumps(metrics, indent=2))
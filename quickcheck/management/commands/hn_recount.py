@@ -0,0 +1,28 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from quickcheck.cache import bump_generation
+from quickcheck.counters import recount_all
+from quickcheck.feed import refresh_feed
+from quickcheck.sync import advisory_lock
+
+
+class Command(BaseCommand):
+    help = (
+        "Recomputes the kid and descendant counts of every item from the comment tree and fixes "
+        "those that drifted. Refuses to run while a sync is running."
+    )
+
+    def handle(self, *args, **options):
+        # Counts adjusted by a sync while we recount would be overwritten
+        with advisory_lock(settings.HN_SYNC_LOCK_ID) as acquired:
+            if not acquired:
+                raise CommandError("A sync is running, try again once it's done.")
+            with transaction.atomic():
+                corrected = recount_all()
+                refresh_feed(corrected)
+
+        if corrected:
+            bump_generation()
+        self.stdout.write(self.style.SUCCESS(f"Corrected the counts of {len(corrected)} items."))
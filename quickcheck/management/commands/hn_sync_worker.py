@@ -0,0 +1,59 @@
+from apscheduler.schedulers.blocking import BlockingScheduler
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+from django.utils import timezone
+
+from quickcheck.sync import advisory_lock, link_all_pending_parents, sync_data, sync_updates
+
+
+class Command(BaseCommand):
+    help = (
+        "Syncs new and updated items from Hacker News on a schedule. Any number of workers can run; "
+        "a Postgres advisory lock makes sure only one of them syncs at a time."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--once", action="store_true", help="Run a single sync and exit.")
+        parser.add_argument(
+            "--interval",
+            type=int,
+            default=settings.HN_SYNC_INTERVAL_MINUTES,
+            help="Minutes between syncs.",
+        )
+
+    def handle(self, *args, **options):
+        if options["once"]:
+            self.run_sync()
+            return
+
+        scheduler = BlockingScheduler()
+        scheduler.add_job(
+            self.run_sync,
+            trigger="interval",
+            minutes=options["interval"],
+            next_run_time=timezone.now(),
+            max_instances=1,
+            coalesce=True,
+        )
+        self.stdout.write(f"Syncing from Hacker News every {options['interval']} minutes.")
+        try:
+            scheduler.start()
+        except (KeyboardInterrupt, SystemExit):
+            pass
+
+    def run_sync(self):
+        close_old_connections()
+        try:
+            with advisory_lock(settings.HN_SYNC_LOCK_ID) as acquired:
+                if not acquired:
+                    self.stdout.write("Another worker is syncing, skipping this run.")
+                    return
+                sync_data()
+                sync_updates()
+                # Comments whose parents arrived in a later batch, or from a backfill or import
+                linked = link_all_pending_parents()
+                if linked:
+                    self.stdout.write(f"Linked {linked} items to their parents.")
+        finally:
+            close_old_connections()
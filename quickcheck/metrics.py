@@ -0,0 +1,229 @@
+import bisect
+import threading
+import time
+from contextlib import ExitStack
+
+from django.core.cache import cache
+from django.db import connections
+
+
+SYNC_METRICS_KEY = "quickcheck:metrics:sync"
+
+# Upper bounds, in seconds, of the latency histogram buckets
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_BUCKETS = (1, 2, 3, 5, 10, 20, 50, 100)
+CACHE_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1)
+
+
+def format_labels(names, values):
+    if not names:
+        return ""
+    return "{%s}" % ",".join(
+        '%s="%s"' % (name, str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n"))
+        for name, value in zip(names, values)
+    )
+
+
+class Metric:
+    """
+    A metric family and its values per combination of labels, in this
+    process. Rendered in the Prometheus text format.
+    """
+
+    kind = None
+
+    def __init__(self, name, documentation, labels=()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self.lock = threading.Lock()
+        self.values = {}
+
+    def key(self, labels):
+        return tuple(str(labels.get(name, "")) for name in self.labels)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        with self.lock:
+            for key, value in sorted(self.values.items()):
+                lines += self.render_value(key, value)
+        return lines
+
+    def render_value(self, key, value):
+        return [f"{self.name}{format_labels(self.labels, key)} {value!r}"]
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def inc(self, amount=1, **labels):
+        key = self.key(labels)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+
+class Gauge(Metric):
+    kind = "gauge"
+
+    def set(self, value, **labels):
+        with self.lock:
+            self.values[self.key(labels)] = value
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labels=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, documentation, labels)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, **labels):
+        key = self.key(labels)
+        with self.lock:
+            counts, total = self.values.get(key, ([0] * (len(self.buckets) + 1), 0.0))
+            counts[bisect.bisect_left(self.buckets, value)] += 1
+            self.values[key] = (counts, total + value)
+
+    def render_value(self, key, value):
+        counts, total = value
+        names = self.labels + ("le",)
+        lines, cumulative = [], 0
+        for bound, count in zip(self.buckets + ("+Inf",), counts):
+            cumulative += count
+            lines.append(f"{self.name}_bucket{format_labels(names, key + (bound,))} {cumulative}")
+        labels = format_labels(self.labels, key)
+        lines.append(f"{self.name}_sum{labels} {total!r}")
+        lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+
+class Registry:
+    """
+    The metrics of one process.
+    """
+
+    def __init__(self):
+        self.metrics = []
+
+    def add(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def render(self):
+        return "".join(line + "\n" for metric in self.metrics for line in metric.render())
+
+
+# Recorded by the web processes, for their own requests
+registry = Registry()
+REQUESTS = registry.add(Counter(
+    "quickcheck_http_requests_total", "Requests served, by view, method and status.", ["view", "method", "status"],
+))
+REQUEST_SECONDS = registry.add(Histogram(
+    "quickcheck_http_request_duration_seconds", "Time spent serving requests, by view.", ["view"],
+))
+REQUEST_QUERIES = registry.add(Histogram(
+    "quickcheck_http_request_queries", "Database queries run per request, by view.", ["view"], buckets=QUERY_BUCKETS,
+))
+RESPONSE_CACHE_LOOKUPS = registry.add(Counter(
+    "quickcheck_response_cache_lookups_total", "Response cache lookups, by result (hit or miss).", ["result"],
+))
+RESPONSE_CACHE_HIT_RATIO = registry.add(Gauge(
+    "quickcheck_response_cache_hit_ratio", "Share of response cache lookups that were hits.",
+))
+RESPONSE_CACHE_SECONDS = registry.add(Histogram(
+    "quickcheck_response_cache_lookup_seconds", "Time spent looking up cached responses.", buckets=CACHE_BUCKETS,
+))
+
+# Recorded by the sync worker, which publishes them through the cache
+sync_registry = Registry()
+SYNC_RUNS = sync_registry.add(Counter(
+    "quickcheck_sync_runs_total", "Sync runs, by job (new items or updates).", ["job"],
+))
+SYNC_SECONDS = sync_registry.add(Gauge(
+    "quickcheck_sync_last_run_seconds", "Duration of the last sync run, by job.", ["job"],
+))
+SYNC_LAST_RUN = sync_registry.add(Gauge(
+    "quickcheck_sync_last_run_timestamp_seconds", "When the last sync run finished, by job.", ["job"],
+))
+SYNC_ITEMS = sync_registry.add(Counter(
+    "quickcheck_sync_items_fetched_total", "Items fetched from Hacker News, by job and item type.", ["job", "type"],
+))
+SYNC_RATE = sync_registry.add(Gauge(
+    "quickcheck_sync_items_per_second", "Items fetched per second in the last sync run, by job.", ["job"],
+))
+SYNC_LAG = sync_registry.add(Gauge(
+    "quickcheck_sync_lag_items", "Items between the last stored item and maxitem when the last sync started.",
+))
+HN_REQUEST_SECONDS = sync_registry.add(Histogram(
+    "quickcheck_hn_request_duration_seconds", "Latency of Hacker News API requests, by endpoint.", ["endpoint"],
+))
+HN_REQUEST_ERRORS = sync_registry.add(Counter(
+    "quickcheck_hn_request_errors_total", "Failed Hacker News API requests, by endpoint.", ["endpoint"],
+))
+WRITE_SECONDS = sync_registry.add(Histogram(
+    "quickcheck_sync_batch_write_seconds", "Time spent writing one batch of synced items.",
+))
+WRITE_ITEMS = sync_registry.add(Counter(
+    "quickcheck_sync_items_written_total", "Synced items written to the database.",
+))
+
+
+def record_cache_lookup(hit, seconds):
+    """
+    Records one lookup of the response cache, and the hit ratio so far.
+    """
+    RESPONSE_CACHE_LOOKUPS.inc(result="hit" if hit else "miss")
+    RESPONSE_CACHE_SECONDS.observe(seconds)
+    with RESPONSE_CACHE_LOOKUPS.lock:
+        hits = RESPONSE_CACHE_LOOKUPS.values.get(("hit",), 0)
+        lookups = hits + RESPONSE_CACHE_LOOKUPS.values.get(("miss",), 0)
+    RESPONSE_CACHE_HIT_RATIO.set(hits / lookups)
+
+
+def publish_sync_metrics():
+    """
+    Stores the sync metrics of this process in the cache, where the
+    /metrics view of every web process picks them up.
+    """
+    cache.set(SYNC_METRICS_KEY, sync_registry.render(), timeout=None)
+
+
+def render_metrics():
+    """
+    The request metrics of this process, followed by the latest sync
+    metrics published by the sync worker.
+    """
+    return registry.render() + (cache.get(SYNC_METRICS_KEY) or "")
+
+
+class RequestMetricsMiddleware:
+    """
+    Records the latency and the number of database queries of every
+    request, by the name of the view that served it.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        queries = 0
+
+        def count_query(execute, sql, params, many, context):
+            nonlocal queries
+            queries += 1
+            return execute(sql, params, many, context)
+
+        start = time.perf_counter()
+        # Reads may go to a replica rather than the default database
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(count_query))
+            response = self.get_response(request)
+        seconds = time.perf_counter() - start
+
+        match = request.resolver_match
+        view = match.view_name if match else "unmatched"
+        REQUESTS.inc(view=view, method=request.method, status=response.status_code)
+        REQUEST_SECONDS.observe(seconds, view=view)
+        REQUEST_QUERIES.observe(queries, view=view)
+        return response
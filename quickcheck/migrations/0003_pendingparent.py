@@ -0,0 +1,21 @@
+# Generated by Django 3.2 on 2026-10-18 12:57
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('quickcheck', '0002_auto_20230812_1010'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PendingParent',
+            fields=[
+                ('item', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='pending_parent', serialize=False, to='quickcheck.base')),
+                ('parent_HN_id', models.IntegerField(db_index=True)),
+            ],
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 3.2 on 2026-10-18 12:59
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('quickcheck', '0003_pendingparent'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BackfillShard',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('start_HN_id', models.IntegerField()),
+                ('end_HN_id', models.IntegerField()),
+                ('next_HN_id', models.IntegerField()),
+                ('done', models.BooleanField(default=False)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'unique_together': {('start_HN_id', 'end_HN_id')},
+            },
+        ),
+    ]
@@ -0,0 +1,79 @@
+# Generated by Django 3.2 on 2026-10-18 13:00
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+# Copies the existing items into the new feed table
+FILL_FEED_SQL = """
+    INSERT INTO quickcheck_itemfeed (
+        item_id, "HN_id", type, by, time, title, url, score, descendants, "parent_HN_id", kid_count
+    )
+    SELECT
+        b.id, b."HN_id", b.type, b.by, b.time,
+        COALESCE(s.title, j.title, p.title),
+        COALESCE(s.url, j.url),
+        COALESCE(s.score, p.score, o.score),
+        COALESCE(s.descendants, p.descendants),
+        parent."HN_id",
+        (SELECT count(*) FROM quickcheck_comment AS k WHERE k.parent_id = b.id)
+    FROM quickcheck_base AS b
+    LEFT JOIN quickcheck_story AS s ON s.base_ptr_id = b.id
+    LEFT JOIN quickcheck_job AS j ON j.base_ptr_id = b.id
+    LEFT JOIN quickcheck_poll AS p ON p.base_ptr_id = b.id
+    LEFT JOIN quickcheck_comment AS c ON c.base_ptr_id = b.id
+    LEFT JOIN quickcheck_pollopt AS o ON o.base_ptr_id = b.id
+    LEFT JOIN quickcheck_base AS parent ON parent.id = COALESCE(c.parent_id, o.parent_id)
+    ON CONFLICT (item_id) DO UPDATE SET
+        "HN_id" = EXCLUDED."HN_id",
+        type = EXCLUDED.type,
+        by = EXCLUDED.by,
+        time = EXCLUDED.time,
+        title = EXCLUDED.title,
+        url = EXCLUDED.url,
+        score = EXCLUDED.score,
+        descendants = EXCLUDED.descendants,
+        "parent_HN_id" = EXCLUDED."parent_HN_id",
+        kid_count = EXCLUDED.kid_count
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('quickcheck', '0004_backfillshard'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ItemFeed',
+            fields=[
+                ('item', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='feed', serialize=False, to='quickcheck.base')),
+                ('HN_id', models.IntegerField(null=True)),
+                ('type', models.CharField(choices=[('job', 'job'), ('story', 'story'), ('comment', 'comment'), ('poll', 'poll'), ('pollopt', 'pollopt')], max_length=10)),
+                ('by', models.CharField(max_length=255, null=True)),
+                ('time', models.DateTimeField(null=True)),
+                ('title', models.CharField(max_length=255, null=True)),
+                ('url', models.URLField(max_length=500, null=True)),
+                ('score', models.IntegerField(null=True)),
+                ('descendants', models.IntegerField(null=True)),
+                ('parent_HN_id', models.IntegerField(null=True)),
+                ('kid_count', models.IntegerField(default=0)),
+            ],
+            options={
+                'ordering': ['-time'],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='itemfeed',
+            index=models.Index(fields=['type', '-time'], include=('HN_id', 'by', 'title'), name='itemfeed_type_time_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='itemfeed',
+            index=models.Index(fields=['-time'], name='itemfeed_time_idx'),
+        ),
+        migrations.RunSQL(
+            sql=FILL_FEED_SQL,
+            reverse_sql=migrations.RunSQL.noop,
+        ),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 3.2 on 2026-10-18 13:02
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+from django.db import migrations
+
+
+# Indexes the title and text of the existing items
+FILL_SEARCH_VECTOR_SQL = """
+    UPDATE quickcheck_itemfeed AS f SET search_vector =
+        setweight(to_tsvector('english', COALESCE(f.title, '')), 'A')
+        || setweight(to_tsvector('english', COALESCE(j.text, p.text, c.text, '')), 'B')
+    FROM quickcheck_base AS b
+    LEFT JOIN quickcheck_job AS j ON j.base_ptr_id = b.id
+    LEFT JOIN quickcheck_poll AS p ON p.base_ptr_id = b.id
+    LEFT JOIN quickcheck_comment AS c ON c.base_ptr_id = b.id
+    WHERE f.item_id = b.id
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('quickcheck', '0005_itemfeed'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='itemfeed',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(null=True),
+        ),
+        migrations.AddIndex(
+            model_name='itemfeed',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['search_vector'], name='itemfeed_search_idx'),
+        ),
+        migrations.RunSQL(
+            sql=FILL_SEARCH_VECTOR_SQL,
+            reverse_sql=migrations.RunSQL.noop,
+        ),
+    ]
@@ -0,0 +1,66 @@
+# Generated by Django 3.2 on 2026-10-18 13:09
+
+from django.db import migrations, models
+
+
+# Counts the kids and descendants of the existing items
+COUNT_SQL = """
+    WITH RECURSIVE ancestors AS (
+        SELECT parent_id AS id, 1 AS depth
+        FROM quickcheck_comment
+        WHERE parent_id IS NOT NULL
+      UNION ALL
+        SELECT c.parent_id, a.depth + 1
+        FROM ancestors AS a
+        JOIN quickcheck_comment AS c ON c.base_ptr_id = a.id
+        WHERE c.parent_id IS NOT NULL
+    ), totals AS (
+        SELECT id, count(*) FILTER (WHERE depth = 1) AS kids, count(*) AS descendants
+        FROM ancestors
+        GROUP BY id
+    )
+    UPDATE quickcheck_base AS b SET kid_count = t.kids, descendant_count = t.descendants
+    FROM totals AS t
+    WHERE b.id = t.id;
+
+    UPDATE quickcheck_itemfeed AS f SET kid_count = b.kid_count, descendant_count = b.descendant_count
+    FROM quickcheck_base AS b
+    WHERE f.item_id = b.id AND (b.kid_count > 0 OR f.kid_count > 0);
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('quickcheck', '0006_itemfeed_search'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='base',
+            name='descendant_count',
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='base',
+            name='kid_count',
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='itemfeed',
+            name='descendant_count',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddIndex(
+            model_name='itemfeed',
+            index=models.Index(fields=['-kid_count'], name='itemfeed_kid_count_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='itemfeed',
+            index=models.Index(fields=['-descendant_count'], name='itemfeed_descendants_idx'),
+        ),
+        migrations.RunSQL(
+            sql=COUNT_SQL,
+            reverse_sql=migrations.RunSQL.noop,
+        ),
+    ]
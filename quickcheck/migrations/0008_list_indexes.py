@@ -0,0 +1,41 @@
+# Generated by Django 3.2 on 2026-10-18 13:23
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('quickcheck', '0007_counters'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='itemfeed',
+            name='itemfeed_type_time_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='itemfeed',
+            name='itemfeed_time_idx',
+        ),
+        migrations.AddIndex(
+            model_name='base',
+            index=models.Index(fields=['type', '-time', '-id'], name='base_type_time_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='base',
+            index=models.Index(fields=['-time', '-id'], name='base_time_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='itemfeed',
+            index=models.Index(condition=models.Q(type__in=['story', 'job', 'poll']), fields=['-time', '-item'], include=('HN_id', 'by', 'title'), name='itemfeed_top_time_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='itemfeed',
+            index=models.Index(fields=['type', '-time', '-item'], name='itemfeed_type_time_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='itemfeed',
+            index=models.Index(fields=['-time', '-item'], name='itemfeed_time_idx'),
+        ),
+    ]
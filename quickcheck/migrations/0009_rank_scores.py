@@ -0,0 +1,31 @@
+# Generated by Django 3.2 on 2026-10-18 13:25
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('quickcheck', '0008_list_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='itemfeed',
+            name='best_score',
+            field=models.FloatField(null=True),
+        ),
+        migrations.AddField(
+            model_name='itemfeed',
+            name='top_score',
+            field=models.FloatField(null=True),
+        ),
+        migrations.AddIndex(
+            model_name='itemfeed',
+            index=models.Index(condition=models.Q(top_score__isnull=False), fields=['-top_score', '-item'], name='itemfeed_top_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='itemfeed',
+            index=models.Index(condition=models.Q(best_score__isnull=False), fields=['-best_score', '-item'], name='itemfeed_best_idx'),
+        ),
+    ]
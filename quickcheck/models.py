@@ -1,5 +1,7 @@
 import uuid
 
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVectorField
 from django.db import models
 
 
@@ -13,6 +15,9 @@ class Base(models.Model):
         ("pollopt", "pollopt"),
     ]
 
+    # Fields that can change on Hacker News after an item is first synced
+    MUTABLE_FIELDS = ["deleted", "dead"]
+
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
     HN_id = models.IntegerField(unique=True, null=True)
     type = models.CharField(max_length=10, choices=TYPE_CHOICES)
@@ -20,9 +25,18 @@ class Base(models.Model):
     time = models.DateTimeField(null=True)
     deleted = models.BooleanField(default=False)
     dead = models.BooleanField(default=False)
+    # Maintained by quickcheck.counters as comments are added and removed
+    kid_count = models.IntegerField(default=0, editable=False)
+    descendant_count = models.IntegerField(default=0, editable=False)
 
     class Meta:
         ordering = ["-time"]
+        indexes = [
+            # Lists of one type and of everything, newest first, with the pk
+            # as the tie-breaker cursor pagination orders by
+            models.Index(fields=["type", "-time", "-id"], name="base_type_time_idx"),
+            models.Index(fields=["-time", "-id"], name="base_time_idx"),
+        ]
     
     def __str__(self):
         return f"{self.type.capitalize()} by {self.by}"
@@ -56,3 +70,79 @@ class Poll(Base):
 class PollOpt(Base):
     parent = models.ForeignKey(Poll, on_delete=models.CASCADE, null=True,related_name="parts")
     score = models.IntegerField(null=True)
+
+
+class PendingParent(models.Model):
+    """
+    Synced items whose parent wasn't in the database when they were written.
+    The parent FK is filled in once an item with parent_HN_id lands.
+    """
+    item = models.OneToOneField(Base, on_delete=models.CASCADE, primary_key=True, related_name="pending_parent")
+    parent_HN_id = models.IntegerField(db_index=True)
+
+
+class BackfillShard(models.Model):
+    """
+    A range of HN ids fetched by `manage.py hn_backfill`. next_HN_id is the
+    checkpoint a crashed or interrupted shard resumes from.
+    """
+    start_HN_id = models.IntegerField()
+    end_HN_id = models.IntegerField()
+    next_HN_id = models.IntegerField()
+    done = models.BooleanField(default=False)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        unique_together = [("start_HN_id", "end_HN_id")]
+
+    def __str__(self):
+        return f"HN ids {self.start_HN_id}-{self.end_HN_id}"
+
+
+class ItemFeed(models.Model):
+    """
+    Denormalized read model with one row per item holding everything the
+    list views show, so listing doesn't join the child tables. Kept up to
+    date by quickcheck.feed.refresh_feed.
+    """
+    item = models.OneToOneField(Base, on_delete=models.CASCADE, primary_key=True, related_name="feed")
+    HN_id = models.IntegerField(null=True)
+    type = models.CharField(max_length=10, choices=Base.TYPE_CHOICES)
+    by = models.CharField(max_length=255, null=True)
+    time = models.DateTimeField(null=True)
+    title = models.CharField(max_length=255, null=True)
+    url = models.URLField(null=True, max_length=500)
+    score = models.IntegerField(null=True)
+    descendants = models.IntegerField(null=True)
+    parent_HN_id = models.IntegerField(null=True)
+    kid_count = models.IntegerField(default=0)
+    descendant_count = models.IntegerField(default=0)
+    # Title and text of the item, for full-text search
+    search_vector = SearchVectorField(null=True)
+    # Ranks in the top and best feeds, set by quickcheck.ranking for recent
+    # stories and polls only
+    top_score = models.FloatField(null=True)
+    best_score = models.FloatField(null=True)
+
+    class Meta:
+        ordering = ["-time"]
+        indexes = [
+            GinIndex(fields=["search_vector"], name="itemfeed_search_idx"),
+            # Cursor pagination orders by (time, pk). The HTML listing only
+            # shows top-level items and these columns.
+            models.Index(
+                fields=["-time", "-item"],
+                include=["HN_id", "by", "title"],
+                condition=models.Q(type__in=["story", "job", "poll"]),
+                name="itemfeed_top_time_idx",
+            ),
+            models.Index(fields=["type", "-time", "-item"], name="itemfeed_type_time_idx"),
+            models.Index(fields=["-time", "-item"], name="itemfeed_time_idx"),
+            models.Index(fields=["-top_score", "-item"], condition=models.Q(top_score__isnull=False), name="itemfeed_top_idx"),
+            models.Index(fields=["-best_score", "-item"], condition=models.Q(best_score__isnull=False), name="itemfeed_best_idx"),
+            models.Index(fields=["-kid_count"], name="itemfeed_kid_count_idx"),
+            models.Index(fields=["-descendant_count"], name="itemfeed_descendants_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.type.capitalize()} by {self.by}"
@@ -0,0 +1,171 @@
+import logging
+import random
+import re
+import threading
+import time
+from collections import Counter, defaultdict
+from contextlib import ExitStack, contextmanager
+
+from django.conf import settings
+from django.db import connections
+
+
+logger = logging.getLogger(__name__)
+
+_local = threading.local()
+
+# Turns a query into its shape, so the same query run for different rows
+# (the N+1 pattern) has the same fingerprint
+FINGERPRINT_PATTERNS = [
+    (re.compile(r"'(?:[^']|'')*'"), "?"),
+    (re.compile(r"\b\d+(?:\.\d+)?\b"), "?"),
+    (re.compile(r"%s"), "?"),
+    (re.compile(r"\(\s*\?(?:\s*,\s*\?)*\s*\)"), "(...)"),
+    (re.compile(r"\s+"), " "),
+]
+
+
+def fingerprint(sql):
+    for pattern, replacement in FINGERPRINT_PATTERNS:
+        sql = pattern.sub(replacement, sql)
+    return sql.strip()
+
+
+class RequestProfile:
+    """
+    Splits the time of one request between phases: "db" for queries,
+    "view" and "render", and any span code opens, e.g. "serialize". Each
+    phase is timed exclusive of those nested in it, so they add up to the
+    total. Queries are also counted by fingerprint.
+    """
+
+    def __init__(self):
+        self.start = self.last = time.perf_counter()
+        self.stack = ["middleware"]
+        self.timings = defaultdict(float)
+        self.fingerprints = Counter()
+
+    def switch(self):
+        now = time.perf_counter()
+        self.timings[self.stack[-1]] += now - self.last
+        self.last = now
+
+    def push(self, phase):
+        self.switch()
+        self.stack.append(phase)
+
+    def pop(self, phase=None):
+        if len(self.stack) > 1 and phase in (None, self.stack[-1]):
+            self.switch()
+            self.stack.pop()
+
+    @contextmanager
+    def span(self, phase):
+        self.push(phase)
+        try:
+            yield
+        finally:
+            self.pop(phase)
+
+    def execute(self, execute, sql, params, many, context):
+        self.fingerprints[fingerprint(sql)] += 1
+        with self.span("db"):
+            return execute(sql, params, many, context)
+
+    def finish(self):
+        while len(self.stack) > 1:
+            self.pop()
+        self.switch()
+        return self.last - self.start
+
+    @property
+    def queries(self):
+        return sum(self.fingerprints.values())
+
+    def duplicates(self):
+        """
+        (count, fingerprint) of the queries run more than once, most
+        repeated first.
+        """
+        return sorted(
+            ((count, sql) for sql, count in self.fingerprints.items() if count > 1), reverse=True
+        )
+
+    def server_timing(self, total):
+        duplicates = sum(count for count, _ in self.duplicates())
+        entries = [f'db;dur={self.timings["db"] * 1000:.1f};desc="{self.queries} queries, {duplicates} repeated"']
+        entries += [
+            f"{phase};dur={seconds * 1000:.1f}" for phase, seconds in self.timings.items() if phase != "db"
+        ]
+        entries.append(f"total;dur={total * 1000:.1f}")
+        return ", ".join(entries)
+
+
+def profile_span(phase):
+    """
+    Times a block as its own phase of the request being profiled, if any.
+    """
+    profile = getattr(_local, "profile", None)
+    if profile is None:
+        return _null_span()
+    return profile.span(phase)
+
+
+@contextmanager
+def _null_span():
+    yield
+
+
+class ProfilingMiddleware:
+    """
+    Profiles a sample of the requests, PROFILE_SAMPLE_RATE of them (off by
+    default). Profiled responses get a Server-Timing header with the time
+    spent in queries, the view, rendering and the spans opened with
+    profile_span; those slower than PROFILE_SLOW_SECONDS are logged with
+    their repeated queries. Requests not sampled only cost a random draw.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if random.random() >= settings.PROFILE_SAMPLE_RATE:
+            return self.get_response(request)
+
+        profile = _local.profile = RequestProfile()
+        try:
+            # Reads may go to a replica rather than the default database
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(profile.execute))
+                response = self.get_response(request)
+        finally:
+            _local.profile = None
+        total = profile.finish()
+
+        response["Server-Timing"] = profile.server_timing(total)
+        if total >= settings.PROFILE_SLOW_SECONDS:
+            logger.warning(
+                "Slow request %s %s: %.0fms, %s queries, %s, repeated queries: %s",
+                request.method,
+                request.get_full_path(),
+                total * 1000,
+                profile.queries,
+                {phase: round(seconds * 1000, 1) for phase, seconds in profile.timings.items()},
+                profile.duplicates()[:5],
+            )
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        profile = getattr(_local, "profile", None)
+        if profile is not None:
+            profile.push("view")
+
+    def process_template_response(self, request, response):
+        profile = getattr(_local, "profile", None)
+        if profile is not None:
+            # The view is done, the response renders next
+            profile.pop("view")
+            profile.push("render")
+            response.add_post_render_callback(lambda response: profile.pop("render"))
+        return response
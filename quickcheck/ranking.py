@@ -0,0 +1,79 @@
+import datetime
+import uuid
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+
+
+# Item types the ranked feeds list
+RANKED_TYPES = ["story", "poll"]
+
+# How fast items sink as they age. "top" favours what is hot right now,
+# "best" what has been most popular over the ranking window.
+TOP_GRAVITY = 1.8
+BEST_GRAVITY = 0.5
+
+# Scores one batch of ranked items, newest first from a (time, pk) cursor.
+# Points are the item's score, plus a quarter point per comment; age is in
+# hours.
+RANK_BATCH_SQL = """
+    WITH batch AS (
+        SELECT item_id,
+               COALESCE(score, 0) + COALESCE(descendants, descendant_count) / 4.0 AS points,
+               extract(epoch FROM %(now)s - time) / 3600 AS age
+        FROM quickcheck_itemfeed
+        WHERE type = ANY(%(types)s) AND time >= %(cutoff)s AND (time, item_id) < (%(time)s, %(pk)s)
+        ORDER BY time DESC, item_id DESC
+        LIMIT %(limit)s
+    )
+    UPDATE quickcheck_itemfeed AS f SET
+        top_score = (batch.points - 1) / power(GREATEST(batch.age, 0) + 2, %(top_gravity)s),
+        best_score = batch.points / power(GREATEST(batch.age, 0) + 2, %(best_gravity)s)
+    FROM batch
+    WHERE f.item_id = batch.item_id
+    RETURNING f.time, f.item_id
+"""
+
+# Drops the items that have aged out of the window from the ranked feeds
+UNRANK_SQL = """
+    UPDATE quickcheck_itemfeed SET top_score = NULL, best_score = NULL
+    WHERE (top_score IS NOT NULL OR best_score IS NOT NULL) AND (time < %s OR time IS NULL)
+"""
+
+
+def recompute_rank_scores(batch_size=None, window_hours=None):
+    """
+    Recomputes the top and best scores of the items posted within the
+    ranking window, batch_size items per statement and transaction, so
+    feed reads are never blocked for long. Items older than the window
+    lose their scores. Returns the number of items scored.
+    """
+    batch_size = batch_size or settings.HN_RANK_BATCH_SIZE
+    window_hours = window_hours or settings.HN_RANK_WINDOW_HOURS
+    now = timezone.now()
+    params = {
+        "now": now,
+        "types": RANKED_TYPES,
+        "cutoff": now - datetime.timedelta(hours=window_hours),
+        "limit": batch_size,
+        "top_gravity": TOP_GRAVITY,
+        "best_gravity": BEST_GRAVITY,
+        # Starts the cursor past every item, even those dated in the future
+        "time": datetime.datetime.max.replace(tzinfo=datetime.timezone.utc),
+        "pk": uuid.UUID(int=2**128 - 1),
+    }
+
+    scored = 0
+    with connection.cursor() as cursor:
+        while True:
+            with transaction.atomic():
+                cursor.execute(RANK_BATCH_SQL, params)
+                rows = cursor.fetchall()
+            if not rows:
+                break
+            scored += len(rows)
+            params["time"], params["pk"] = min(rows)
+        with transaction.atomic():
+            cursor.execute(UNRANK_SQL, [params["cutoff"]])
+    return scored
@@ -0,0 +1,69 @@
+from collections import OrderedDict
+
+from django.conf import settings
+
+from quickcheck.models import Base
+
+
+class ParentResolver:
+    """
+    Bounded LRU cache mapping HN_id to the (pk, type) of the local item, so
+    comment and pollopt parents can be set by id without fetching models.
+    """
+
+    def __init__(self, maxsize=None):
+        self.maxsize = maxsize or settings.HN_SYNC_RESOLVER_SIZE
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def add(self, HN_id, pk, item_type):
+        self.entries[HN_id] = (pk, item_type)
+        self.entries.move_to_end(HN_id)
+        while len(self.entries) > self.maxsize:
+            self.entries.popitem(last=False)
+
+    def warm(self, start, stop):
+        """
+        Loads the most recent items with HN_id between start and stop in a
+        single query, capped at the cache size.
+        """
+        rows = (
+            Base.objects.filter(HN_id__gte=start, HN_id__lte=stop)
+            .order_by("-HN_id")
+            .values_list("HN_id", "id", "type")[:self.maxsize]
+        )
+        for HN_id, pk, item_type in reversed(list(rows)):
+            self.add(HN_id, pk, item_type)
+
+    def resolve(self, HN_ids):
+        """
+        Returns a dict of HN_id to (pk, type) for those HN_ids that exist
+        locally. Cache misses are looked up together in one query.
+        """
+        found = {}
+        missing = set()
+        for HN_id in set(HN_ids):
+            if HN_id in self.entries:
+                self.entries.move_to_end(HN_id)
+                found[HN_id] = self.entries[HN_id]
+                self.hits += 1
+            else:
+                missing.add(HN_id)
+                self.misses += 1
+
+        if missing:
+            for HN_id, pk, item_type in Base.objects.filter(HN_id__in=missing).values_list("HN_id", "id", "type"):
+                self.add(HN_id, pk, item_type)
+                found[HN_id] = (pk, item_type)
+        return found
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self.entries),
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / lookups if lookups else 0.0,
+        }
@@ -1,96 +1,179 @@
-import datetime
+import logging
+import time
+from collections import Counter
+from contextlib import contextmanager
 
-import requests
 from django.conf import settings
-from django.utils import timezone
+from django.db import connection, transaction
 
-from quickcheck.models import Story, Job, Comment, Poll, PollOpt, Base
+from quickcheck.cache import bump_generation
+from quickcheck.counters import add_comments_to_counts
+from quickcheck.feed import refresh_feed
+from quickcheck.fetcher import ItemFetcher
+from quickcheck.metrics import (
+    SYNC_ITEMS,
+    SYNC_LAG,
+    SYNC_LAST_RUN,
+    SYNC_RATE,
+    SYNC_RUNS,
+    SYNC_SECONDS,
+    publish_sync_metrics,
+)
+from quickcheck.models import Base
+from quickcheck.ranking import recompute_rank_scores
+from quickcheck.resolver import ParentResolver
+from quickcheck.writer import ItemWriter, apply_updates, link_pending_parents
 
 
-def sync_data():
+logger = logging.getLogger(__name__)
+
+
+def record_sync_run(job, seconds, item_types):
+    """
+    Records a finished sync run, and how many items of each type it fetched,
+    then publishes the sync metrics to the web processes.
+    """
+    for item_type, count in item_types.items():
+        SYNC_ITEMS.inc(count, job=job, type=item_type)
+    SYNC_RUNS.inc(job=job)
+    SYNC_SECONDS.set(seconds, job=job)
+    SYNC_RATE.set(sum(item_types.values()) / seconds if seconds else 0.0, job=job)
+    SYNC_LAST_RUN.set(time.time(), job=job)
+    publish_sync_metrics()
+
+
+@contextmanager
+def advisory_lock(key):
+    """
+    Takes a Postgres session-level advisory lock without waiting for it.
+    Yields whether the lock was acquired. Other databases have no shared
+    lock, so the lock is always considered acquired there.
+    """
+    if connection.vendor != "postgresql":
+        yield True
+        return
+
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT pg_try_advisory_lock(%s)", [key])
+        acquired = cursor.fetchone()[0]
+    try:
+        yield acquired
+    finally:
+        if acquired:
+            with connection.cursor() as cursor:
+                cursor.execute("SELECT pg_advisory_unlock(%s)", [key])
+
+
+def sync_data(concurrency=None):
     """
     Syncs the data from Hacker News API to the database.
     """
+    with ItemFetcher(concurrency=concurrency) as fetcher:
+        _sync_items(fetcher)
+
+
+def _sync_items(fetcher):
+    start = time.perf_counter()
     # Get the latest item ID from Hacker News API
-    max_id = requests.get(f"{settings.HACKER_NEWS_API_URL}/maxitem.json").json()
+    max_id = fetcher.fetch_max_item()
     
     # Get the latest item ID from the database or start from the latest 100 items
     last_synced_item = Base.objects.exclude(HN_id=None).order_by("-HN_id").first()
     last_synced_item_id = last_synced_item.HN_id if last_synced_item else max_id - 100
-    print("=================LAST SYNCED ITEM=================", last_synced_item_id)
+    SYNC_LAG.set(max_id - last_synced_item_id)
+    logger.info("Syncing items %s to %s", last_synced_item_id + 1, max_id)
 
-    # Sync from last synced to latest item in HN
-    for index in range(last_synced_item_id + 1, max_id + 1):
-        print(f"Getting item {index}...")
-        item = requests.get(f"{settings.HACKER_NEWS_API_URL}/item/{index}.json").json()
+    # Most comments reply to recent items, so preload those before syncing
+    resolver = ParentResolver()
+    resolver.warm(last_synced_item_id - settings.HN_SYNC_RESOLVER_WINDOW, last_synced_item_id)
 
+    # Sync from last synced to latest item in HN, writing in batches
+    writer = ItemWriter(resolver=resolver)
+    item_types = Counter()
+    for index, item in fetcher.fetch_items(range(last_synced_item_id + 1, max_id + 1)):
+        logger.debug("Fetched item %s", index)
         if item is None: continue
+        item_types[item.get("type")] += 1
+        writer.add(item)
+    writer.flush()
 
-        elif item["type"] == "job":
-            Job.objects.create(
-                HN_id=item["id"],
-                type=item["type"],
-                by=item.get("by"),
-                time=timezone.make_aware(datetime.datetime.fromtimestamp(item.get("time"))),
-                deleted=item.get("deleted", False),
-                dead=item.get("dead", False),
-                text=item.get("text"),
-                title=item.get("title"),
-                url=item.get("url"),
-            )
-        elif item["type"] == "story":
-            Story.objects.create(
-                HN_id=item["id"],
-                type=item["type"],
-                by=item.get("by"),
-                time=timezone.make_aware(datetime.datetime.fromtimestamp(item.get("time"))),
-                deleted=item.get("deleted", False),
-                dead=item.get("dead", False),
-                descendants=item.get("descendants"),
-                score=item.get("score"),
-                title=item.get("title"),
-                url=item.get("url"),
-            )
-        elif item["type"] == "comment":
-            if item.get("parent"):
-                parent = Base.objects.filter(HN_id=item["parent"]).first()
-
-            Comment.objects.create(
-                HN_id=item["id"],
-                type=item["type"],
-                by=item.get("by"),
-                time=timezone.make_aware(datetime.datetime.fromtimestamp(item.get("time"))),
-                deleted=item.get("deleted", False),
-                dead=item.get("dead", False),
-                parent=parent,
-                text=item.get("text"),
-            )
-        elif item["type"] == "poll":
-            Poll.objects.create(
-                HN_id=item["id"],
-                type=item["type"],
-                by=item.get("by"),
-                time=timezone.make_aware(datetime.datetime.fromtimestamp(item.get("time"))),
-                deleted=item.get("deleted", False),
-                dead=item.get("dead", False),
-                descendants=item.get("descendants"),
-                score=item.get("score"),
-                title=item.get("title"),
-                text=item.get("text"),
-            )
-        elif item["type"] == "pollopt":
-            if item.get("parent"):
-                parent = Poll.objects.filter(HN_id=item["parent"]).first()
-
-            PollOpt.objects.create(
-                HN_id=item["id"],
-                type=item["type"],
-                by=item.get("by"),
-                time=timezone.make_aware(datetime.datetime.fromtimestamp(item.get("time"))),
-                deleted=item.get("deleted", False),
-                dead=item.get("dead", False),
-                parent=parent,
-                score=item.get("score"),
-            )
-    
-    print("=====================Syncing Done=====================")
+    seconds = time.perf_counter() - start
+    record_sync_run("new", seconds, item_types)
+    logger.info(
+        "Synced %s new items in %.1fs (%s), parent resolver: %s",
+        writer.inserted, seconds, dict(item_types), resolver.stats(),
+    )
+
+
+def sync_updates(concurrency=None):
+    """
+    Refreshes the items Hacker News reports as recently changed in
+    updates.json, then recomputes the ranking scores. Returns the metrics
+    of the run.
+    """
+    with ItemFetcher(concurrency=concurrency) as fetcher:
+        # updates.json also lists changed profiles, but we don't store HN users
+        changed_ids = sorted(fetcher.get_json("updates.json").get("items", []))
+
+        run_start = start = time.perf_counter()
+        items = [item for _, item in fetcher.fetch_items(changed_ids) if item is not None]
+        fetch_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    updated = apply_updates(items)
+    apply_seconds = time.perf_counter() - start
+
+    # Scores changed and every item has aged, so rerank the feeds
+    start = time.perf_counter()
+    ranked = recompute_rank_scores()
+    bump_generation()
+    metrics = {
+        "changed": len(changed_ids),
+        "updated": updated,
+        "ranked": ranked,
+        "fetch_seconds": round(fetch_seconds, 3),
+        "apply_seconds": round(apply_seconds, 3),
+        "rank_seconds": round(time.perf_counter() - start, 3),
+    }
+    record_sync_run("updates", time.perf_counter() - run_start, Counter(item.get("type") for item in items))
+    logger.info("Synced updates: %s", metrics)
+    return metrics
+
+
+def backfill_shard(shard, concurrency=None):
+    """
+    Fetches the HN ids of a BackfillShard from its checkpoint onwards. The
+    checkpoint is saved in the same transaction as each batch of items, so
+    an interrupted shard resumes exactly where it stopped.
+    """
+    # Batches are only written below, together with the checkpoint
+    writer = ItemWriter(autoflush=False)
+    with ItemFetcher(concurrency=concurrency) as fetcher:
+        item_ids = range(shard.next_HN_id, shard.end_HN_id + 1)
+        for position, (index, item) in enumerate(fetcher.fetch_items(item_ids), start=1):
+            if item is not None:
+                writer.add(item)
+            if position % writer.batch_size == 0 or index == shard.end_HN_id:
+                with transaction.atomic():
+                    writer.flush()
+                    shard.next_HN_id = index + 1
+                    shard.done = index == shard.end_HN_id
+                    shard.save(update_fields=["next_HN_id", "done", "updated_at"])
+
+    if not shard.done:
+        # Nothing was left to fetch, the shard had already reached its end
+        shard.done = True
+        shard.save(update_fields=["done", "updated_at"])
+    return writer.inserted
+
+
+def link_all_pending_parents():
+    """
+    Links every queued orphan whose parent has been stored since.
+    """
+    with transaction.atomic(), connection.cursor() as cursor:
+        linked = link_pending_parents(cursor)
+        refresh_feed(linked + add_comments_to_counts(linked))
+    if linked:
+        bump_generation()
+    return len(linked)
@@ -1,3 +1,711 @@
-from django.test import TestCase
+import base64
+import csv
+import datetime
+import gzip
+import io
+import json
+import os
+import random
+import tempfile
+import threading
+import time
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.sessions.models import Session
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection, router, transaction
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.renderers import JSONRenderer
+
+from config.renderers import ORJSONRenderer
+from config.routers import ReplicaMiddleware
+
+from quickcheck.bench import StubHNServer
+from quickcheck.cache import bump_generation, get_generation
+from quickcheck.counters import recount_all
+from quickcheck.feed import refresh_feed
+from quickcheck.fetcher import ItemFetcher
+from quickcheck.importer import import_dumps
+from quickcheck.models import Story, Job, Comment, Poll, PollOpt, Base, BackfillShard, ItemFeed, PendingParent
+from quickcheck.profiling import fingerprint
+from quickcheck.ranking import recompute_rank_scores
+from quickcheck.resolver import ParentResolver
+from quickcheck.serializers import AllItemsSerializer, ItemRowSerializer
+from quickcheck.sync import backfill_shard, link_all_pending_parents, record_sync_run
+from quickcheck.views import AllItemsViewSet
+from quickcheck.writer import ItemWriter, apply_updates
+
+
+def encode_cursor(position):
+    return base64.urlsafe_b64encode(json.dumps(position).encode()).decode()
+
+
+class AllItemsListTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        # Items get older as HN_id grows, so every page mixes all types
+        def make(model, HN_id, **kwargs):
+            time = timezone.now() - datetime.timedelta(minutes=HN_id)
+            return model.objects.create(HN_id=HN_id, type=model.__name__.lower(), by="pg", time=time, **kwargs)
+
+        for HN_id in range(100, 200, 10):
+            story = make(Story, HN_id, title="Story", score=1)
+            comment = make(Comment, HN_id + 1, parent=story, text="Hi")
+            make(Comment, HN_id + 2, parent=comment, text="Reply")
+            poll = make(Poll, HN_id + 3, title="Poll")
+            make(PollOpt, HN_id + 4, parent=poll)
+            make(Job, HN_id + 5, title="Job")
+        recount_all()
+        refresh_feed()
+
+    def setUp(self):
+        cache.clear()
+
+    def test_query_count_does_not_depend_on_page_size(self):
+        # Feed page, items, kids and parts. Both pages stop
+        # short of the last timed item, after which items without a time are read too. How
+        # the count is made depends on the table statistics, so it's left out.
+        for page_size in [5, 50]:
+            cache.clear()
+            with mock.patch("config.pagination.approximate_count", return_value=60), self.assertNumQueries(4):
+                response = self.client.get("/all/", {"page_size": page_size}, HTTP_ACCEPT="application/json")
+            self.assertEqual(len(response.json()["results"]), page_size)
+
+    @override_settings(STATICFILES_STORAGE="django.contrib.staticfiles.storage.StaticFilesStorage")
+    def test_html_list_is_not_counted(self):
+        # Only the feed page
+        with self.assertNumQueries(1):
+            self.client.get("/all/", HTTP_ACCEPT="text/html")
+
+    def test_stories_are_counted_from_the_planner_estimate(self):
+        with connection.cursor() as cursor:
+            cursor.execute("ANALYZE quickcheck_base, quickcheck_story")
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get("/stories/")
+        self.assertFalse([query for query in queries if "COUNT(" in query["sql"]])
+        self.assertEqual(response.json()["count"], 10)
+
+    def test_cursor_pages_cover_every_item_once(self):
+        seen = []
+        url = "/all/?page_size=7"
+        while url:
+            page = self.client.get(url, HTTP_ACCEPT="application/json").json()
+            seen += [item["HN_id"] for item in page["results"]]
+            previous, url = page["previous"], page["next"]
+        self.assertEqual(seen, sorted(seen))
+        self.assertEqual(len(seen), 60)
+
+        # Going back from the last page gives the page before it
+        page = self.client.get(previous, HTTP_ACCEPT="application/json").json()
+        self.assertEqual([item["HN_id"] for item in page["results"]], seen[-11:-4])
+
+    def test_invalid_cursors_are_not_found(self):
+        time = timezone.now().isoformat()
+        for position in [{"t": None, "k": "not-a-uuid"}, {"t": time, "k": "not-a-uuid"}, {"t": "yesterday", "k": None}]:
+            cursor = encode_cursor(position)
+            for url in ["/all/", "/stories/"]:
+                response = self.client.get(url, {"cursor": cursor}, HTTP_ACCEPT="application/json")
+                self.assertEqual(response.status_code, 404, (url, position))
+        response = self.client.get("/all/", {"cursor": "not base64"}, HTTP_ACCEPT="application/json")
+        self.assertEqual(response.status_code, 404)
+
+    def test_items_without_a_time_are_listed_last(self):
+        for HN_id in [1, 2, 3]:
+            Job.objects.create(HN_id=HN_id, type="job", title="Job")
+        refresh_feed()
+
+        seen, previous_pages = [], []
+        url = "/all/?page_size=7"
+        while url:
+            page = self.client.get(url, HTTP_ACCEPT="application/json").json()
+            seen += [item["HN_id"] for item in page["results"]]
+            previous_pages.append(page["previous"])
+            url = page["next"]
+        self.assertEqual(len(seen), 63)
+        self.assertEqual(seen[:60], sorted(seen[:60]))
+        self.assertEqual(sorted(seen[60:]), [1, 2, 3])
+
+        # The last page ends with the untimed items; going back from it reads timed ones
+        page = self.client.get(previous_pages[-1], HTTP_ACCEPT="application/json").json()
+        self.assertEqual([item["HN_id"] for item in page["results"]], seen[-14:-7])
+
+    def test_kids_and_parts_are_listed(self):
+        response = self.client.get("/all/", {"page_size": 60}, HTTP_ACCEPT="application/json")
+        items = {item["HN_id"]: item for item in response.json()["results"]}
+        self.assertEqual(items[100]["kids"], [101])
+        self.assertEqual(items[101]["kids"], [102])
+        self.assertEqual(items[101]["parent"], 100)
+        self.assertEqual(items[103]["parts"], [104])
+
+    def test_list_sorts_and_filters_by_comment_count(self):
+        response = self.client.get("/all/", {"ordering": "-descendant_count", "page_size": 10}, HTTP_ACCEPT="application/json")
+        self.assertEqual({item["type"] for item in response.json()["results"]}, {"story"})
+        self.assertEqual(response.json()["results"][0]["descendant_count"], 2)
+
+        response = self.client.get("/all/", {"kid_count__gte": 1, "page_size": 60}, HTTP_ACCEPT="application/json")
+        self.assertEqual({item["type"] for item in response.json()["results"]}, {"story", "comment"})
+        self.assertEqual(len(response.json()["results"]), 20)
+
+    def test_search_ranks_matches_and_excludes_the_rest(self):
+        story = Story.objects.create(HN_id=1, type="story", time=timezone.now(), title="Scaling Postgres")
+        Comment.objects.create(HN_id=2, type="comment", time=timezone.now(), parent=story, text="Postgres indexes help")
+        Job.objects.create(HN_id=3, type="job", time=timezone.now(), title="Python developer")
+        refresh_feed()
+
+        # Title matches outrank text matches, whatever their time
+        response = self.client.get("/all/", {"search": "postgres"}, HTTP_ACCEPT="application/json")
+        self.assertEqual([item["HN_id"] for item in response.json()["results"]], [1, 2])
+
+        response = self.client.get("/all/", {"search": "postgres -indexes"}, HTTP_ACCEPT="application/json")
+        self.assertEqual([item["HN_id"] for item in response.json()["results"]], [1])
+
+    def test_cached_lists_run_no_queries(self):
+        for params in [{}, {"search": "story"}]:
+            self.client.get("/all/", params, HTTP_ACCEPT="application/json")
+            with self.assertNumQueries(0):
+                response = self.client.get("/all/", params, HTTP_ACCEPT="application/json")
+            self.assertEqual(response["X-Cache"], "HIT")
+            self.assertIn("ETag", response)
+
+    def test_unchanged_list_is_not_modified(self):
+        response = self.client.get("/all/", HTTP_ACCEPT="application/json")
+        etag = response["ETag"]
+
+        response = self.client.get("/all/", HTTP_ACCEPT="application/json", HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.content, b"")
+        self.assertEqual(response["ETag"], etag)
+
+        # Any write bumps the generation, so the old ETag no longer matches
+        bump_generation()
+        response = self.client.get("/all/", HTTP_ACCEPT="application/json", HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response["ETag"], etag)
+
+    @mock.patch("quickcheck.cache.get_replica", return_value="replica1")
+    def test_replica_reads_right_after_a_write_are_not_cached(self, get_replica):
+        bump_generation()
+        for _ in range(2):
+            response = self.client.get("/all/", HTTP_ACCEPT="application/json")
+            self.assertNotIn("X-Cache", response)
+            self.assertNotIn("ETag", response)
+
+        with override_settings(REPLICA_LAG_SECONDS=0):
+            self.client.get("/all/", HTTP_ACCEPT="application/json")
+            response = self.client.get("/all/", HTTP_ACCEPT="application/json")
+        self.assertEqual(response["X-Cache"], "HIT")
+        self.assertIn("ETag", response)
+
+    def test_thread_of_an_unknown_item_is_not_found(self):
+        for pk in ["not-a-uuid", "00000000-0000-0000-0000-000000000000"]:
+            response = self.client.get(f"/all/{pk}/thread/", HTTP_ACCEPT="application/json")
+            self.assertEqual(response.status_code, 404)
+
+    def test_export_streams_filtered_items(self):
+        response = self.client.get("/all/export/", {"type": "comment"})
+        lines = b"".join(response.streaming_content).decode().splitlines()
+        items = [json.loads(line) for line in lines]
+        self.assertEqual(len(items), 20)
+        self.assertEqual(items[0]["parent_HN_id"], 100)
+        self.assertEqual(items[0]["descendant_count"], 1)
+
+        since = (timezone.now() - datetime.timedelta(minutes=114.5)).isoformat()
+        response = self.client.get("/all/export/", {"output": "csv", "since": since})
+        rows = list(csv.DictReader(b"".join(response.streaming_content).decode().splitlines()))
+        self.assertEqual([row["HN_id"] for row in rows], ["100", "101", "102", "103", "104", "105", "110", "111", "112", "113", "114"])
+        self.assertEqual(rows[0]["title"], "Story")
+
+    def test_fast_serializer_matches_all_items_serializer(self):
+        # Items created through the API have no HN_id and are listed by pk
+        story = Story.objects.create(type="story", by="ünï", time=timezone.now(), title='"Quotes" \u2028 \x01 ✓')
+        Comment.objects.create(type="comment", parent=story, text="<p>Line\nbreak \u2029</p>")
+        Comment.objects.create(type="comment", HN_id=999, parent=story, text=None)
+        Job.objects.create(type="job", HN_id=1000, time=None, title="No time")
+
+        items = list(AllItemsViewSet().get_items_queryset())
+        expected = JSONRenderer().render(AllItemsSerializer(items, many=True).data)
+        actual = ORJSONRenderer().render(ItemRowSerializer().serialize([item.pk for item in items]))
+        self.assertEqual(actual, expected)
+
+
+class FeedTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        def make(HN_id, hours_old, score, descendants=0):
+            time = timezone.now() - datetime.timedelta(hours=hours_old)
+            Story.objects.create(HN_id=HN_id, type="story", time=time, title="Story", score=score, descendants=descendants)
+
+        make(1, hours_old=1, score=10)
+        make(2, hours_old=30, score=500)
+        make(3, hours_old=3, score=100, descendants=40)
+        make(4, hours_old=24 * 30, score=5000)
+        Job.objects.create(HN_id=5, type="job", time=timezone.now(), title="Job")
+        refresh_feed()
+        recompute_rank_scores()
+
+    def setUp(self):
+        cache.clear()
+
+    def get_HN_ids(self, feed):
+        response = self.client.get(f"/feeds/{feed}/", HTTP_ACCEPT="application/json")
+        return [item["HN_id"] for item in response.json()["results"]]
+
+    def test_invalid_cursors_are_not_found(self):
+        for position in [{"t": None, "k": "not-a-uuid"}, {"t": 1.5, "k": "not-a-uuid"}, {"t": "high", "k": None}]:
+            for feed in ["top", "best"]:
+                response = self.client.get(f"/feeds/{feed}/", {"cursor": encode_cursor(position)}, HTTP_ACCEPT="application/json")
+                self.assertEqual(response.status_code, 404, (feed, position))
+
+    def test_top_favours_recent_items(self):
+        self.assertEqual(self.get_HN_ids("top"), [3, 1, 2])
+
+    def test_best_favours_popular_items(self):
+        self.assertEqual(self.get_HN_ids("best"), [2, 3, 1])
+
+    def test_new_lists_stories_and_polls_newest_first(self):
+        self.assertEqual(self.get_HN_ids("new"), [1, 3, 2, 4])
+
+
+class MetricsTests(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_metrics_cover_requests_and_the_last_sync(self):
+        self.client.get("/all/", HTTP_ACCEPT="application/json")
+        record_sync_run("new", 2.0, {"story": 3, "comment": 7})
+
+        response = self.client.get("/metrics")
+        self.assertEqual(response.status_code, 200)
+        content = response.content.decode()
+        self.assertIn('quickcheck_http_requests_total{view="all-list",method="GET",status="200"}', content)
+        self.assertIn('quickcheck_http_request_queries_bucket{view="all-list",le="+Inf"}', content)
+        self.assertIn('quickcheck_sync_items_fetched_total{job="new",type="comment"}', content)
+        self.assertIn('quickcheck_sync_items_per_second{job="new"} 5.0', content)
+
+    def test_metrics_cover_the_response_cache(self):
+        def get_metrics():
+            lines = self.client.get("/metrics").content.decode().splitlines()
+            return dict(line.rsplit(" ", 1) for line in lines if not line.startswith("#"))
+
+        # The counters are shared by every test in this process
+        before = get_metrics()
+        self.client.get("/all/", HTTP_ACCEPT="application/json")
+        self.client.get("/all/", HTTP_ACCEPT="application/json")
+        after = get_metrics()
+
+        for result in ["hit", "miss"]:
+            name = 'quickcheck_response_cache_lookups_total{result="%s"}' % result
+            self.assertEqual(float(after[name]) - float(before.get(name, 0)), 1)
+        hits = float(after['quickcheck_response_cache_lookups_total{result="hit"}'])
+        misses = float(after['quickcheck_response_cache_lookups_total{result="miss"}'])
+        self.assertAlmostEqual(float(after["quickcheck_response_cache_hit_ratio"]), hits / (hits + misses))
+        self.assertIn("quickcheck_response_cache_lookup_seconds_count", after)
+
+    @override_settings(METRICS_TOKEN="secret")
+    def test_metrics_token(self):
+        self.assertEqual(self.client.get("/metrics").status_code, 403)
+        self.assertEqual(self.client.get("/metrics", HTTP_AUTHORIZATION="Bearer secret").status_code, 200)
+
+
+class ProfilingTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        for HN_id in range(1, 4):
+            Story.objects.create(HN_id=HN_id, type="story", time=timezone.now(), title="Story")
+        refresh_feed()
+
+    def setUp(self):
+        cache.clear()
+
+    def test_not_sampled_by_default(self):
+        response = self.client.get("/all/", HTTP_ACCEPT="application/json")
+        self.assertNotIn("Server-Timing", response)
+
+    @override_settings(PROFILE_SAMPLE_RATE=1.0, PROFILE_SLOW_SECONDS=0)
+    def test_sampled_requests_are_timed_and_slow_ones_logged(self):
+        with self.assertLogs("quickcheck.profiling", "WARNING") as logs:
+            response = self.client.get("/stories/", HTTP_ACCEPT="application/json")
+        self.assertRegex(response["Server-Timing"], r'^db;dur=[\d.]+;desc="\d+ queries, 3 repeated", .*render;dur=')
+        # The kids of each story are loaded one story at a time
+        self.assertIn("repeated queries: [(3, 'SELECT", logs.output[0])
+
+    def test_fingerprint(self):
+        self.assertEqual(
+            fingerprint("SELECT * FROM t WHERE a IN (%s, %s,\n %s) AND b = 'x' LIMIT 21"),
+            "SELECT * FROM t WHERE a IN (...) AND b = ? LIMIT ?",
+        )
+
+
+@override_settings(CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}})
+@mock.patch("config.routers.get_replicas", return_value=["replica1"])
+class ReplicaRouterTests(SimpleTestCase):
+    def request(self, method, authorization=None):
+        """
+        The databases a request would read items and sessions from.
+        """
+        def get_response(request):
+            response = HttpResponse()
+            response.databases = (router.db_for_read(Story), router.db_for_read(Session), router.db_for_write(Story))
+            return response
+
+        headers = {"HTTP_AUTHORIZATION": authorization} if authorization else {}
+        request = getattr(RequestFactory(), method)("/all/", **headers)
+        return ReplicaMiddleware(get_response)(request).databases
+
+    def test_safe_requests_read_from_a_replica(self, get_replicas):
+        self.assertEqual(self.request("get"), ("replica1", "default", "default"))
+        self.assertEqual(self.request("post"), ("default", "default", "default"))
+        self.assertEqual(router.db_for_read(Story), "default")
+
+    def test_clients_read_from_the_primary_after_writing(self, get_replicas):
+        self.request("post", authorization="Bearer a")
+        self.assertEqual(self.request("get", authorization="Bearer a")[0], "default")
+        self.assertEqual(self.request("get", authorization="Bearer b")[0], "replica1")
+
+
+class CounterTests(TestCase):
+    def counts(self):
+        return dict(Base.objects.filter(HN_id__isnull=False).values_list("HN_id", "descendant_count"))
+
+    def test_synced_counts_match_a_recount(self):
+        # Replies arrive before the comments they reply to, and the story last
+        writer = ItemWriter(batch_size=2)
+        items = [
+            {"id": 4, "type": "comment", "parent": 3, "time": 1},
+            {"id": 3, "type": "comment", "parent": 2, "time": 1},
+            {"id": 5, "type": "comment", "parent": 2, "time": 1},
+            {"id": 2, "type": "comment", "parent": 1, "time": 1},
+            {"id": 1, "type": "story", "time": 1},
+            {"id": 6, "type": "comment", "parent": 1, "time": 1},
+        ]
+        for item in items:
+            writer.add(item)
+        writer.flush()
+
+        self.assertEqual(self.counts(), {1: 5, 2: 3, 3: 1, 4: 0, 5: 0, 6: 0})
+        self.assertEqual(Base.objects.get(HN_id=1).kid_count, 2)
+        self.assertEqual(recount_all(), [])
+
+    def test_flush_only_links_the_orphans_of_its_batch(self):
+        writer = ItemWriter(autoflush=False, batch_size=1)
+        for item in [{"id": 2, "type": "comment", "parent": 1, "time": 1}, {"id": 3, "type": "comment", "parent": 9, "time": 1}]:
+            writer.add(item)
+        self.assertFalse(Base.objects.exists())
+        writer.flush()
+
+        # Story 9 is stored behind the writer's back: its orphan waits for the global pass
+        Story.objects.create(HN_id=9, type="story", time=timezone.now(), title="Story")
+        writer.add({"id": 1, "type": "story", "time": 1})
+        writer.flush()
+        self.assertEqual(Comment.objects.get(HN_id=2).parent.HN_id, 1)
+        self.assertEqual(list(PendingParent.objects.values_list("parent_HN_id", flat=True)), [9])
+
+        self.assertEqual(link_all_pending_parents(), 1)
+        self.assertEqual(Comment.objects.get(HN_id=3).parent.HN_id, 9)
+
+
+@mock.patch("quickcheck.management.commands.hn_sync_worker.close_old_connections")
+@mock.patch("quickcheck.management.commands.hn_sync_worker.sync_updates")
+@mock.patch("quickcheck.management.commands.hn_sync_worker.sync_data")
+class SyncWorkerTests(TestCase):
+    def setUp(self):
+        # Comment 2's parent is stored after the batch that queued it
+        writer = ItemWriter()
+        writer.add({"id": 2, "type": "comment", "parent": 1, "time": 1})
+        writer.flush()
+        Story.objects.create(HN_id=1, type="story", time=timezone.now(), title="Story")
+
+    def test_sync_links_pending_parents(self, sync_data, sync_updates, close_old_connections):
+        call_command("hn_sync_worker", "--once", stdout=io.StringIO())
+        sync_data.assert_called_once_with()
+        sync_updates.assert_called_once_with()
+        self.assertEqual(Comment.objects.get(HN_id=2).parent.HN_id, 1)
+        self.assertFalse(PendingParent.objects.exists())
+
+    def test_nothing_is_linked_while_another_worker_holds_the_lock(self, sync_data, sync_updates, close_old_connections):
+        with mock.patch("quickcheck.management.commands.hn_sync_worker.advisory_lock") as advisory_lock:
+            advisory_lock.return_value.__enter__.return_value = False
+            call_command("hn_sync_worker", "--once", stdout=io.StringIO())
+        sync_data.assert_not_called()
+        self.assertTrue(PendingParent.objects.exists())
+
+
+class UpdateTests(TestCase):
+    def test_updates_change_every_copy_of_stored_items(self):
+        writer = ItemWriter()
+        writer.add({"id": 1, "type": "story", "by": "pg", "time": 1700000000, "title": "Old", "score": 1})
+        writer.add({"id": 2, "type": "comment", "by": "pg", "time": 1700000001, "parent": 1, "text": "Hi"})
+        writer.flush()
+        generation = get_generation()
+
+        updated = apply_updates([
+            {"id": 1, "type": "story", "by": "pg", "time": 1700000000, "title": "New", "score": 50},
+            {"id": 2, "type": "comment", "by": "pg", "time": 1700000001, "parent": 1, "text": "Hi", "deleted": True},
+            {"id": 3, "type": "story", "by": "pg", "time": 1700000002, "title": "Unknown", "score": 7},
+        ])
+        self.assertEqual(updated, 2)
+
+        story = Story.objects.get(HN_id=1)
+        self.assertEqual((story.title, story.score), ("New", 50))
+        self.assertTrue(Base.objects.get(HN_id=2).deleted)
+        self.assertEqual(ItemFeed.objects.get(HN_id=1).title, "New")
+        self.assertEqual(ItemFeed.objects.get(HN_id=1).score, 50)
+        self.assertFalse(Base.objects.filter(HN_id=3).exists())
+        self.assertNotEqual(get_generation(), generation)
+
+    def test_updates_of_unknown_items_change_nothing(self):
+        generation = get_generation()
+        self.assertEqual(apply_updates([{"id": 3, "type": "story", "time": 1700000002, "score": 7}]), 0)
+        self.assertFalse(Base.objects.exists())
+        self.assertEqual(get_generation(), generation)
+
+
+class ResolverTests(TestCase):
+    def setUp(self):
+        self.pks = {
+            HN_id: Story.objects.create(HN_id=HN_id, type="story", time=timezone.now(), title="Story").pk
+            for HN_id in range(1, 6)
+        }
+
+    def test_least_recently_used_entry_is_evicted(self):
+        resolver = ParentResolver(maxsize=3)
+        for HN_id in [1, 2, 3]:
+            with self.assertNumQueries(1):
+                self.assertEqual(resolver.resolve([HN_id]), {HN_id: (self.pks[HN_id], "story")})
+        self.assertEqual((resolver.stats()["hits"], resolver.stats()["misses"]), (0, 3))
+
+        # Using 1 again makes 2 the oldest entry, so adding 4 evicts it
+        with self.assertNumQueries(0):
+            resolver.resolve([1])
+        with self.assertNumQueries(1):
+            resolver.resolve([4])
+        self.assertEqual(list(resolver.entries), [3, 1, 4])
+
+        with self.assertNumQueries(1):
+            self.assertEqual(resolver.resolve([2]), {2: (self.pks[2], "story")})
+        stats = resolver.stats()
+        self.assertEqual((stats["size"], stats["hits"], stats["misses"]), (3, 1, 5))
+        self.assertEqual(stats["hit_ratio"], 1 / 6)
+
+    def test_warm_loads_the_most_recent_items_in_range(self):
+        resolver = ParentResolver(maxsize=3)
+        with self.assertNumQueries(1):
+            resolver.warm(1, 5)
+        self.assertEqual(list(resolver.entries), [3, 4, 5])
+
+        with self.assertNumQueries(0):
+            self.assertEqual(resolver.resolve([4, 5]), {HN_id: (self.pks[HN_id], "story") for HN_id in [4, 5]})
+        with self.assertNumQueries(1):
+            self.assertEqual(resolver.resolve([1, 9]), {1: (self.pks[1], "story")})
+        self.assertEqual((resolver.stats()["hits"], resolver.stats()["misses"]), (2, 2))
+
+
+class JitteryHNServer(StubHNServer):
+    """
+    A StubHNServer whose item responses each take a random time, so they
+    finish out of order. Records which items have been asked for.
+    """
+
+    def __init__(self, max_id):
+        super().__init__(max_id)
+        self.lock = threading.Lock()
+        self.rng = random.Random(0)
+        self.requested = set()
+
+    def make_item(self, item_id):
+        with self.lock:
+            self.requested.add(item_id)
+            delay = self.rng.uniform(0, 0.02)
+        time.sleep(delay)
+        return super().make_item(item_id)
+
+
+class FetcherTests(SimpleTestCase):
+    def test_items_come_back_in_request_order_with_a_bounded_window(self):
+        item_ids = list(range(60, 0, -1))
+        fetched = []
+        with JitteryHNServer(max_id=50) as server, ItemFetcher(base_url=server.url, concurrency=4) as fetcher:
+            window = fetcher.concurrency * 2
+            for item_id, item in fetcher.fetch_items(item_ids):
+                fetched.append((item_id, item))
+                if len(fetched) == 1:
+                    # A slow consumer gives the workers time to run ahead, if they could
+                    time.sleep(0.2)
+                # Besides the items already handed back, at most a window's worth were requested
+                self.assertLessEqual(len(server.requested), len(fetched) + window)
+
+        self.assertEqual([item_id for item_id, _ in fetched], item_ids)
+        self.assertEqual([item for _, item in fetched], [server.make_item(item_id) for item_id in item_ids])
+
+
+class StubFetcher:
+    """
+    Stands in for ItemFetcher: returns a story for every id, and fails at
+    fail_at, like a worker killed partway through its shard.
+    """
+
+    def __init__(self, fail_at=None):
+        self.fail_at = fail_at
+        self.requested = []
+
+    def __call__(self, concurrency=None):
+        return self
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+    def fetch_items(self, item_ids):
+        for item_id in item_ids:
+            if item_id == self.fail_at:
+                raise ConnectionError("Killed")
+            self.requested.append(item_id)
+            yield item_id, {"id": item_id, "type": "story", "by": "pg", "time": 1700000000 + item_id, "title": "Story"}
+
+
+@override_settings(HN_SYNC_BATCH_SIZE=3)
+class BackfillTests(TestCase):
+    def test_interrupted_shard_resumes_from_its_checkpoint(self):
+        shard = BackfillShard.objects.create(start_HN_id=1, end_HN_id=10, next_HN_id=1)
+        with mock.patch("quickcheck.sync.ItemFetcher", StubFetcher(fail_at=8)):
+            with self.assertRaises(ConnectionError):
+                backfill_shard(shard)
+
+        # Items 1-6 were written in two batches, item 7 was lost with the third
+        shard.refresh_from_db()
+        self.assertEqual((shard.next_HN_id, shard.done), (7, False))
+        self.assertEqual(sorted(Base.objects.values_list("HN_id", flat=True)), [1, 2, 3, 4, 5, 6])
+
+        fetcher = StubFetcher()
+        with mock.patch("quickcheck.sync.ItemFetcher", fetcher):
+            self.assertEqual(backfill_shard(shard), 4)
+        self.assertEqual(fetcher.requested, [7, 8, 9, 10])
+        shard.refresh_from_db()
+        self.assertEqual((shard.next_HN_id, shard.done), (11, True))
+        self.assertEqual(sorted(Base.objects.values_list("HN_id", flat=True)), list(range(1, 11)))
+
+
+class ImportTests(TransactionTestCase):
+    # The feed is rebuilt on connections of its own, which only see committed items
+    def test_dumps_load_children_before_parents_once(self):
+        items = [
+            {"id": 3, "type": "comment", "by": "pg", "time": 1700000003, "parent": 2, "text": "Reply"},
+            {"id": 5, "type": "pollopt", "by": "pg", "time": 1700000005, "parent": 4, "score": 2},
+            {"id": 2, "type": "comment", "by": "pg", "time": 1700000002, "parent": 1, "text": "Hi"},
+            None,
+            {"id": 6, "type": "unknown", "time": 1700000006},
+            {"id": 4, "type": "poll", "by": "pg", "time": 1700000004, "title": "Poll"},
+            {"id": 1, "type": "story", "by": "pg", "time": 1700000001, "title": "Story", "score": 1},
+            {"id": 1, "type": "story", "by": "pg", "time": 1700000001, "title": "Story", "score": 1},
+        ]
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "items.json.gz")
+            with gzip.open(path, "wt") as dump:
+                dump.writelines(json.dumps(item) + "\n" for item in items)
+
+            # Small batches, so children are loaded in transactions before their parents'
+            metrics = import_dumps([path], workers=1, chunk_lines=2, batch_size=2)
+            self.assertEqual(metrics["inserted"], 5)
+            again = import_dumps([path], workers=1, chunk_lines=2, batch_size=2)
+            self.assertEqual(again["inserted"], 0)
+
+        self.assertEqual(Base.objects.count(), 5)
+        self.assertEqual(ItemFeed.objects.count(), 5)
+        self.assertFalse(PendingParent.objects.exists())
+        self.assertEqual(Comment.objects.get(HN_id=3).parent.HN_id, 2)
+        self.assertEqual(Comment.objects.get(HN_id=2).parent.HN_id, 1)
+        self.assertEqual(PollOpt.objects.get(HN_id=5).parent.HN_id, 4)
+        counts = dict(Base.objects.values_list("HN_id", "kid_count"))
+        self.assertEqual(counts, {1: 1, 2: 1, 3: 0, 4: 0, 5: 0})
+        self.assertEqual(Base.objects.get(HN_id=1).descendant_count, 2)
+        self.assertEqual(ItemFeed.objects.get(HN_id=1).descendant_count, 2)
+
+
+# The HTML pages link to static files, which aren't collected in tests
+@override_settings(STATICFILES_STORAGE="django.contrib.staticfiles.storage.StaticFilesStorage")
+class ListIndexTests(TestCase):
+    """
+    The list queries should walk an index in the order they page in, never
+    scanning or sorting a whole table. Sequential and bitmap scans and sorts
+    are disabled, since on tables this small the planner would rightly
+    prefer them.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        for HN_id in range(100, 110):
+            time = timezone.now() - datetime.timedelta(minutes=HN_id)
+            Story.objects.create(HN_id=HN_id, type="story", by="pg", time=time, title="Story")
+            Comment.objects.create(HN_id=HN_id + 100, type="comment", by="pg", time=time, text="Hi")
+        refresh_feed()
+        recompute_rank_scores()
+        # Left to autovacuum, the planner may or may not have statistics for
+        # the new rows by the time the plans are checked
+        with connection.cursor() as cursor:
+            cursor.execute("ANALYZE")
+
+    def setUp(self):
+        cache.clear()
+
+    def explain_page_query(self, url, accept="application/json"):
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(url, HTTP_ACCEPT=accept)
+        page_query = next(query["sql"] for query in queries if "ORDER BY" in query["sql"] and "LIMIT" in query["sql"])
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute("SET LOCAL enable_seqscan = off")
+            cursor.execute("SET LOCAL enable_bitmapscan = off")
+            # Rolled back test data leaves the statistics in any state, so
+            # don't let the planner weigh a sort against an index either
+            cursor.execute("SET LOCAL enable_sort = off")
+            cursor.execute("EXPLAIN " + page_query)
+            return "\n".join(line for line, in cursor.fetchall())
+
+    def assertUsesIndex(self, plan, index):
+        self.assertIn(f"using {index} on", plan)
+        self.assertNotIn("Sort", plan)
+
+    def test_all_items(self):
+        self.assertUsesIndex(self.explain_page_query("/all/"), "itemfeed_time_idx")
+
+    def test_all_items_of_a_type(self):
+        self.assertUsesIndex(self.explain_page_query("/all/?type=comment"), "itemfeed_type_time_idx")
+
+    def test_html_list_of_top_level_items(self):
+        self.assertUsesIndex(self.explain_page_query("/all/", accept="text/html"), "itemfeed_top_time_idx")
+
+    def test_stories(self):
+        self.assertUsesIndex(self.explain_page_query("/stories/"), "base_type_time_idx")
+
+    def test_top_feed(self):
+        self.assertUsesIndex(self.explain_page_query("/feeds/top/?page=2&page_size=3"), "itemfeed_top_idx")
+
+    def test_deep_top_feed_page(self):
+        # The count is estimated once the feed has statistics
+        with connection.cursor() as cursor:
+            cursor.execute("ANALYZE quickcheck_itemfeed")
+        seen, url = [], "/feeds/top/?page_size=3"
+        while url:
+            with CaptureQueriesContext(connection) as queries:
+                page = self.client.get(url, HTTP_ACCEPT="application/json").json()
+            for query in queries:
+                self.assertNotIn("COUNT(", query["sql"])
+                self.assertNotIn("OFFSET", query["sql"])
+            seen += [item["HN_id"] for item in page["results"]]
+            url = page["next"]
+        ranked = self.client.get("/feeds/top/?page=1&page_size=10", HTTP_ACCEPT="application/json").json()
+        self.assertEqual(seen, [item["HN_id"] for item in ranked["results"]])
+        self.assertEqual(sorted(seen), list(range(100, 110)))
+
+        cursor = self.client.get("/feeds/top/?page_size=3", HTTP_ACCEPT="application/json").json()["next"]
+        cache.clear()
+        self.assertUsesIndex(self.explain_page_query(cursor), "itemfeed_top_idx")
+
+    def test_next_page(self):
+        cursor = self.client.get("/all/?page_size=5", HTTP_ACCEPT="application/json").json()["next"]
+        self.assertUsesIndex(self.explain_page_query(cursor), "itemfeed_time_idx")
@@ -0,0 +1,89 @@
+import json
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connections, router
+
+from quickcheck.models import Comment
+
+
+# Walks the comment tree under an item depth-first. Each row's path sorts
+# newest siblings first, so ordering by path gives the rows in display order.
+THREAD_SQL = """
+    WITH RECURSIVE thread AS (
+        SELECT c.base_ptr_id AS id, c.parent_id, 1 AS depth,
+               ARRAY[lpad((10000000000 - COALESCE(extract(epoch FROM b.time), 0))::bigint::text, 11, '0')
+                     || b.id::text] AS path
+        FROM quickcheck_comment AS c
+        JOIN quickcheck_base AS b ON b.id = c.base_ptr_id
+        WHERE c.parent_id = %s
+      UNION ALL
+        SELECT c.base_ptr_id, c.parent_id, t.depth + 1,
+               t.path || (lpad((10000000000 - COALESCE(extract(epoch FROM b.time), 0))::bigint::text, 11, '0')
+                          || b.id::text)
+        FROM thread AS t
+        JOIN quickcheck_comment AS c ON c.parent_id = t.id
+        JOIN quickcheck_base AS b ON b.id = c.base_ptr_id
+        WHERE t.depth < %s
+    )
+    SELECT t.id, b."HN_id", b.by, b.time, b.deleted, b.dead, c.text, t.parent_id, t.depth
+    FROM thread AS t
+    JOIN quickcheck_base AS b ON b.id = t.id
+    JOIN quickcheck_comment AS c ON c.base_ptr_id = t.id
+    ORDER BY t.path
+    LIMIT %s
+"""
+
+THREAD_COLUMNS = ["id", "HN_id", "by", "time", "deleted", "dead", "text", "parent", "depth"]
+
+
+def iter_thread(item_pk, max_depth, limit=None):
+    """
+    Yields the comments under an item as dicts, depth-first, in one query
+    read through a server-side cursor. A limit cuts the walk short but
+    always leaves a connected tree.
+    """
+    with connections[router.db_for_read(Comment)].chunked_cursor() as cursor:
+        cursor.execute(THREAD_SQL, [item_pk, max_depth, limit])
+        while True:
+            rows = cursor.fetchmany(500)
+            if not rows:
+                break
+            for row in rows:
+                yield dict(zip(THREAD_COLUMNS, row))
+
+
+def build_thread(rows):
+    """
+    Assembles rows from iter_thread into nested lists of comments, each
+    with its own "kids" list.
+    """
+    roots = []
+    nodes = {}
+    for row in rows:
+        row["kids"] = []
+        nodes[row["id"]] = row
+        siblings = nodes[row["parent"]]["kids"] if row["depth"] > 1 else roots
+        siblings.append(row)
+    return roots
+
+
+def stream_thread_json(item, rows):
+    """
+    Renders an item and the rows from iter_thread as nested JSON, chunk by
+    chunk, holding no more than the current branch in memory.
+    """
+    encode = DjangoJSONEncoder(ensure_ascii=False).encode
+    # Every node is written without its closing brace, which comes after its kids
+    yield encode({"id": item.id, "HN_id": item.HN_id, "type": item.type})[:-1] + ', "kids": ['
+    open_nodes = [True]
+    for row in rows:
+        while len(open_nodes) > row["depth"]:
+            open_nodes.pop()
+            yield "]}"
+        if not open_nodes[-1]:
+            yield ","
+        open_nodes[-1] = False
+        node = {column: row[column] for column in THREAD_COLUMNS if column not in ("parent", "depth")}
+        yield encode(node)[:-1] + ', "kids": ['
+        open_nodes.append(True)
+    yield "]}" * len(open_nodes)
@@ -1,12 +1,18 @@
 from rest_framework.response import Response
 from rest_framework import viewsets
+from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
+from rest_framework.filters import OrderingFilter
+from rest_framework.generics import get_object_or_404
 from rest_framework.permissions import IsAuthenticatedOrReadOnly
-from rest_framework.filters import SearchFilter
+from rest_framework.renderers import BrowsableAPIRenderer
+from django.db import transaction
+from django.db.models import Prefetch
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseForbidden, StreamingHttpResponse
+from django.utils.crypto import constant_time_compare
 from django.shortcuts import render
 from django_filters.rest_framework import DjangoFilterBackend
-from django.core.paginator import Paginator, EmptyPage, PageNotAnInteger
-import atexit
-from apscheduler.schedulers.background import BackgroundScheduler
 
 from quickcheck.serializers import (
     StorySerializer,
@@ -14,89 +20,255 @@ from quickcheck.serializers import (
     CommentSerializer,
     PollSerializer,
     PollOptSerializer,
-    AllItemsSerializer
+    AllItemsSerializer,
+    ItemRowSerializer,
 )
+from quickcheck.cache import bump_generation, cached_response, conditional_response
+from quickcheck.counters import add_comments_to_counts
+from quickcheck.export import EXPORT_FORMATS, export_rows, parse_time
+from quickcheck.filters import FullTextSearchFilter
+from quickcheck.metrics import render_metrics
 from quickcheck.permissions import IsOwnerOrReadOnly
-from quickcheck.models import Story, Job, Comment, Poll, PollOpt, Base
-from quickcheck.sync import sync_data
-from config.pagination import CustomPagination
+from quickcheck.profiling import profile_span
+from quickcheck.ranking import RANKED_TYPES
+from quickcheck.feed import refresh_feed
+from quickcheck.models import Story, Job, Comment, Poll, PollOpt, Base, ItemFeed
+from quickcheck.threads import build_thread, iter_thread, stream_thread_json
+from config.pagination import KeysetPagination
+from config.renderers import ORJSONRenderer
+
+
+def get_positive_int(request, name, default):
+    value = request.query_params.get(name)
+    if value is None:
+        return default
+    try:
+        value = int(value)
+        if value < 1:
+            raise ValueError
+    except ValueError:
+        raise ValidationError({name: "Must be a positive integer."})
+    return value
 
 
 class AllItemsViewSet(viewsets.ModelViewSet):
     queryset = Base.objects.all()
     serializer_class = AllItemsSerializer
     template_name = "quickcheck/index.html"
-    filter_backends = [DjangoFilterBackend, SearchFilter]
-    filterset_fields = ["type"]
-    search_fields = ["job__title", "job__text", "story__title", "poll__title", "poll__text"]
-    pagination_class = CustomPagination
+    filter_backends = [DjangoFilterBackend, FullTextSearchFilter, OrderingFilter]
+    filterset_fields = {
+        "type": ["exact"],
+        "kid_count": ["exact", "gte", "lte"],
+        "descendant_count": ["exact", "gte", "lte"],
+    }
+    ordering_fields = ["time", "kid_count", "descendant_count"]
+    pagination_class = KeysetPagination
     http_method_names = ["get"] # this view is read-only
+    renderer_classes = [ORJSONRenderer, BrowsableAPIRenderer]
+    thread_max_depth = 100
+    thread_html_limit = 1000
+    item_rows = ItemRowSerializer()
+
+    def get_queryset(self):
+        # Lists are filtered, sorted and paginated on the single-table feed
+        if self.action == "list":
+            return ItemFeed.objects.all()
+        return self.get_items_queryset()
+
+    def get_items_queryset(self):
+        # Load every child table in the same query and the kids/parts of a
+        # whole page in one query each, so the query count is independent
+        # of the page size
+        return Base.objects.select_related(
+            "job", "story", "poll", "comment__parent", "pollopt__parent"
+        ).prefetch_related(
+            Prefetch("kids", queryset=Comment.objects.only("id", "HN_id", "parent")),
+            Prefetch("poll__parts", queryset=PollOpt.objects.only("id", "HN_id", "parent")),
+        )
 
+    @conditional_response()
+    @cached_response
     def list(self, request, *args, **kwargs):
         # apply filters
         self.queryset = self.filter_queryset(self.get_queryset())
 
         if request.accepted_renderer.format == 'json':
-            # apply pagination and return JSON response
+            # apply pagination and return JSON response, built from plain rows
             page = self.paginate_queryset(self.queryset)
-            serializer = self.get_serializer(page, many=True)
-            return self.get_paginated_response(serializer.data)
+            with profile_span("serialize"):
+                data = self.item_rows.serialize([row.item_id for row in page])
+            return self.get_paginated_response(data)
         else:
-            # apply pagination and return HTML response
-            paginator = Paginator(self.queryset.filter(type__in=["story", "job", "poll"]), self.pagination_class.page_size)
-            page_number = request.GET.get('page')
-            try:
-                data = paginator.page(page_number)
-            except PageNotAnInteger:
-                data = paginator.page(1)
-            except EmptyPage:
-                data = paginator.page(paginator.num_pages)
-
-            # Calculate a range of page numbers for dynamic pagination links
-            max_pages_to_display = 10
-            current_page = data.number
-            start_page = max(current_page - max_pages_to_display // 2, 1)
-            end_page = min(start_page + max_pages_to_display, paginator.num_pages)
-
-            return render(request, self.template_name, {'data': data, 'start_page': start_page, 'end_page': end_page})
+            # apply pagination and return HTML response, served entirely from the feed
+            paginator = self.pagination_class()
+            data = paginator.paginate_queryset(self.queryset.filter(type__in=["story", "job", "poll"]), request, self)
+            with profile_span("render"):
+                return render(request, self.template_name, {
+                    'data': data,
+                    'next_link': paginator.get_next_link(),
+                    'previous_link': paginator.get_previous_link(),
+                })
     
+    @conditional_response()
+    @cached_response
     def retrieve(self, request, *args, **kwargs):
         # retrieve method to return only HTML response
         item = self.get_object()
-        return render(request, "quickcheck/item.html", {'item': item})
+        thread = build_thread(iter_thread(item.pk, max_depth=2, limit=self.thread_html_limit))
+        return render(request, "quickcheck/item.html", {'item': item, 'thread': thread})
+
+    @action(detail=True, url_path="thread")
+    def thread(self, request, pk=None):
+        """
+        The whole comment tree under an item, loaded in one query. Use
+        max_depth and limit to cut it short. JSON is streamed, so there's no
+        limit by default; the HTML page shows at most 1000 comments.
+        """
+        # DRF's get_object_or_404 also turns a malformed id into a 404
+        item = get_object_or_404(Base, pk=pk)
+        max_depth = get_positive_int(request, "max_depth", self.thread_max_depth)
+
+        if request.accepted_renderer.format == 'json':
+            rows = iter_thread(item.pk, max_depth, get_positive_int(request, "limit", None))
+            return StreamingHttpResponse(stream_thread_json(item, rows), content_type="application/json")
+
+        rows = iter_thread(item.pk, max_depth, get_positive_int(request, "limit", self.thread_html_limit))
+        return render(request, "quickcheck/thread.html", {'item': item, 'thread': build_thread(rows)})
+
+    @action(detail=False, url_path="export")
+    def export(self, request):
+        """
+        Streams every item as NDJSON (default) or CSV, chosen with
+        ?output=ndjson|csv. Filter with type, and with since and until
+        (ISO 8601, until is exclusive).
+        """
+        output = request.query_params.get("output", "ndjson")
+        if output not in EXPORT_FORMATS:
+            raise ValidationError({"output": f"Must be one of: {', '.join(EXPORT_FORMATS)}."})
+        item_type = request.query_params.get("type")
+        if item_type and item_type not in dict(Base.TYPE_CHOICES):
+            raise ValidationError({"type": f"Unknown type {item_type!r}."})
+        times = {}
+        for name in ["since", "until"]:
+            value = request.query_params.get(name)
+            try:
+                times[name] = parse_time(value) if value else None
+            except ValueError:
+                raise ValidationError({name: "Must be an ISO 8601 date and time."})
+
+        render_rows, content_type = EXPORT_FORMATS[output]
+        response = StreamingHttpResponse(
+            render_rows(export_rows(item_type, **times)), content_type=f"{content_type}; charset=utf-8"
+        )
+        response["Content-Disposition"] = f'attachment; filename="items.{output}"'
+        return response
+
 
+class FeedViewSet(viewsets.GenericViewSet):
+    """
+    Hacker News style ranked lists of stories and polls: top (hot right
+    now), best (most popular this week) and new. Each page is a single
+    index range scan on the feed, from a cursor on the rank, the ranks
+    being precomputed by the sync.
+    """
+    queryset = ItemFeed.objects.filter(type__in=RANKED_TYPES)
+    pagination_class = KeysetPagination
+    renderer_classes = [ORJSONRenderer, BrowsableAPIRenderer]
+    http_method_names = ["get"]
+    item_rows = ItemRowSerializer()
 
-class StoryViewSet(viewsets.ModelViewSet):
-    queryset = Story.objects.all()
+    def ranked_list(self, queryset):
+        page = self.paginate_queryset(queryset)
+        with profile_span("serialize"):
+            data = self.item_rows.serialize([row.item_id for row in page])
+        return self.get_paginated_response(data)
+
+    @action(detail=False)
+    @cached_response
+    def top(self, request):
+        return self.ranked_list(self.get_queryset().filter(top_score__isnull=False).order_by("-top_score", "-item_id"))
+
+    @action(detail=False)
+    @cached_response
+    def best(self, request):
+        return self.ranked_list(self.get_queryset().filter(best_score__isnull=False).order_by("-best_score", "-item_id"))
+
+    @action(detail=False)
+    @cached_response
+    def new(self, request):
+        # Unordered, so it gets cursor pagination on time
+        return self.ranked_list(self.get_queryset())
+
+
+class ItemDestroyMixin:
+    """
+    Takes a deleted comment and its replies out of the counts of its
+    ancestors, refreshes their feed rows and invalidates cached responses.
+    """
+
+    def perform_destroy(self, instance):
+        parent_id = getattr(instance, "parent_id", None)
+        with transaction.atomic():
+            counted = add_comments_to_counts([instance.pk], sign=-1)
+            instance.delete()
+            refresh_feed([pk for pk in [parent_id, *counted] if pk])
+        bump_generation()
+
+
+class StoryViewSet(ItemDestroyMixin, viewsets.ModelViewSet):
+    # The redundant type filter lets lists walk the (type, time) index on
+    # Base instead of every item's time
+    queryset = Story.objects.filter(type="story")
     serializer_class = StorySerializer
+    pagination_class = KeysetPagination
     permission_classes = [IsAuthenticatedOrReadOnly, IsOwnerOrReadOnly]
 
+    @conditional_response()
+    @cached_response
+    def list(self, request, *args, **kwargs):
+        return super().list(request, *args, **kwargs)
+
+    @conditional_response()
+    def retrieve(self, request, *args, **kwargs):
+        return super().retrieve(request, *args, **kwargs)
+
 
-class JobViewSet(viewsets.ModelViewSet):
-    queryset = Job.objects.all()
+class JobViewSet(ItemDestroyMixin, viewsets.ModelViewSet):
+    queryset = Job.objects.filter(type="job")
     serializer_class = JobSerializer
+    pagination_class = KeysetPagination
     permission_classes = [IsAuthenticatedOrReadOnly, IsOwnerOrReadOnly]
 
 
-class CommentViewSet(viewsets.ModelViewSet):
-    queryset = Comment.objects.all()
+class CommentViewSet(ItemDestroyMixin, viewsets.ModelViewSet):
+    queryset = Comment.objects.filter(type="comment")
     serializer_class = CommentSerializer
+    pagination_class = KeysetPagination
     permission_classes = [IsAuthenticatedOrReadOnly, IsOwnerOrReadOnly]
 
 
-class PollViewSet(viewsets.ModelViewSet):
-    queryset = Poll.objects.all()
+class PollViewSet(ItemDestroyMixin, viewsets.ModelViewSet):
+    queryset = Poll.objects.filter(type="poll")
     serializer_class = PollSerializer
+    pagination_class = KeysetPagination
     permission_classes = [IsAuthenticatedOrReadOnly, IsOwnerOrReadOnly]
 
 
-class PollOptViewSet(viewsets.ModelViewSet):
-    queryset = PollOpt.objects.all()
+class PollOptViewSet(ItemDestroyMixin, viewsets.ModelViewSet):
+    queryset = PollOpt.objects.filter(type="pollopt")
     serializer_class = PollOptSerializer
+    pagination_class = KeysetPagination
     permission_classes = [IsAuthenticatedOrReadOnly, IsOwnerOrReadOnly]
 
 
-scheduler = BackgroundScheduler()
-scheduler.add_job(func=sync_data, trigger="interval", minutes=5)
-scheduler.start()
-atexit.register(lambda: scheduler.shutdown())
+def metrics(request):
+    """
+    Request and sync metrics in the Prometheus text format. Request metrics
+    are those of the process serving the scrape. When METRICS_TOKEN is set,
+    it must be sent as a bearer token.
+    """
+    if settings.METRICS_TOKEN and not constant_time_compare(
+        request.headers.get("Authorization", ""), f"Bearer {settings.METRICS_TOKEN}"
+    ):
+        return HttpResponseForbidden()
+    return HttpResponse(render_metrics(), content_type="text/plain; version=0.0.4; charset=utf-8")
@@ -0,0 +1,263 @@
+import datetime
+import time
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+
+from quickcheck.cache import bump_generation
+from quickcheck.counters import add_comments_to_counts
+from quickcheck.feed import refresh_feed
+from quickcheck.metrics import WRITE_ITEMS, WRITE_SECONDS
+from quickcheck.models import Story, Job, Comment, Poll, PollOpt, Base, PendingParent
+from quickcheck.resolver import ParentResolver
+
+
+ITEM_MODELS = {
+    "job": Job,
+    "story": Story,
+    "comment": Comment,
+    "poll": Poll,
+    "pollopt": PollOpt,
+}
+
+
+def parse_item(item):
+    """
+    Maps an item from the Hacker News API onto the column values of Base and
+    its child table. Returns None for item types we don't store.
+    """
+    model = ITEM_MODELS.get(item.get("type"))
+    if model is None:
+        return None
+
+    row = {
+        "id": Base._meta.pk.get_default(),
+        "HN_id": item["id"],
+        "type": item["type"],
+        "by": item.get("by"),
+        "time": timezone.make_aware(datetime.datetime.fromtimestamp(item["time"])) if item.get("time") else None,
+        "deleted": item.get("deleted", False),
+        "dead": item.get("dead", False),
+        "parent_HN_id": item.get("parent"),
+    }
+    for field in model._meta.local_concrete_fields:
+        if not field.is_relation:
+            row[field.attname] = item.get(field.name)
+    return row
+
+
+def insert_rows(cursor, model, rows, conflict_field=None):
+    """
+    Inserts rows into the model's own table with a single multi-row INSERT.
+    With a conflict_field, rows clashing on it are skipped and the values of
+    that field for the rows actually inserted are returned.
+    """
+    qn = connection.ops.quote_name
+    fields = model._meta.local_concrete_fields
+    placeholders = "(%s)" % ", ".join(["%s"] * len(fields))
+    sql = "INSERT INTO %s (%s) VALUES %s" % (
+        qn(model._meta.db_table),
+        ", ".join(qn(field.column) for field in fields),
+        ", ".join([placeholders] * len(rows)),
+    )
+    params = [
+        field.get_db_prep_save(row.get(field.attname, field.get_default()), connection)
+        for row in rows
+        for field in fields
+    ]
+
+    if conflict_field is None:
+        cursor.execute(sql, params)
+        return None
+
+    column = qn(model._meta.get_field(conflict_field).column)
+    cursor.execute(f"{sql} ON CONFLICT ({column}) DO NOTHING RETURNING {column}", params)
+    return {value for value, in cursor.fetchall()}
+
+
+def link_pending_parents(cursor, rows=None):
+    """
+    Points items waiting in PendingParent at their parent wherever the parent
+    has since been stored, then drops those entries. Returns the pks of the
+    items that got a parent.
+
+    With rows, only the entries of those items, or whose parent is one of
+    them, are looked at. Parallel writers then never touch each other's
+    entries, and the cost doesn't grow with the backlog of orphans.
+    """
+    scope, params = "", []
+    if rows is not None:
+        if not rows:
+            return []
+        scope = 'AND (p."parent_HN_id" = ANY(%s) OR p.item_id = ANY(%s))'
+        params = [[row["HN_id"] for row in rows], [row["id"] for row in rows]]
+
+    cursor.execute("""
+        UPDATE quickcheck_comment AS c SET parent_id = b.id
+        FROM quickcheck_pendingparent AS p
+        JOIN quickcheck_base AS b ON b."HN_id" = p."parent_HN_id"
+        WHERE c.base_ptr_id = p.item_id %s
+        RETURNING c.base_ptr_id
+    """ % scope, params)
+    linked = [pk for pk, in cursor.fetchall()]
+    cursor.execute("""
+        UPDATE quickcheck_pollopt AS o SET parent_id = b.id
+        FROM quickcheck_pendingparent AS p
+        JOIN quickcheck_base AS b ON b."HN_id" = p."parent_HN_id"
+        JOIN quickcheck_poll AS poll ON poll.base_ptr_id = b.id
+        WHERE o.base_ptr_id = p.item_id %s
+        RETURNING o.base_ptr_id
+    """ % scope, params)
+    linked += [pk for pk, in cursor.fetchall()]
+    cursor.execute("""
+        DELETE FROM quickcheck_pendingparent AS p
+        USING quickcheck_base AS b
+        WHERE b."HN_id" = p."parent_HN_id" %s
+    """ % scope, params)
+    return linked
+
+
+def update_rows(cursor, model, rows):
+    """
+    Overwrites the model's own non-relational columns for the stored items
+    matching each row's HN_id, with a single UPDATE ... FROM (VALUES ...).
+    Returns the pks of the rows updated.
+    """
+    qn = connection.ops.quote_name
+    fields = [field for field in model._meta.local_concrete_fields if not field.is_relation and not field.primary_key]
+    if model is Base:
+        fields = [field for field in fields if field.name in Base.MUTABLE_FIELDS]
+
+    placeholders = "(%s)" % ", ".join(
+        ["CAST(%%s AS %s)" % field.db_type(connection) for field in fields] + ["CAST(%s AS integer)"]
+    )
+    columns = [qn(field.column) for field in fields]
+    if model is Base:
+        join = 'WHERE t."HN_id" = v."HN_id" RETURNING t.id'
+    else:
+        join = 'JOIN quickcheck_base AS b ON b."HN_id" = v."HN_id" WHERE t.base_ptr_id = b.id RETURNING t.base_ptr_id'
+
+    sql = "UPDATE %s AS t SET %s FROM (VALUES %s) AS v(%s) %s" % (
+        qn(model._meta.db_table),
+        ", ".join(f"{column} = v.{column}" for column in columns),
+        ", ".join([placeholders] * len(rows)),
+        ", ".join(columns + ['"HN_id"']),
+        join,
+    )
+    params = []
+    for row in rows:
+        params += [field.get_db_prep_save(row.get(field.attname), connection) for field in fields]
+        params.append(row["HN_id"])
+    cursor.execute(sql, params)
+    return [pk for pk, in cursor.fetchall()]
+
+
+def apply_updates(items):
+    """
+    Applies fresh copies of already stored Hacker News items: scores,
+    descendants, titles, text and the deleted/dead flags. Items we don't
+    have are ignored. Returns the number of items updated.
+    """
+    rows = [row for row in map(parse_item, items) if row is not None]
+    if not rows:
+        return 0
+
+    with transaction.atomic(), connection.cursor() as cursor:
+        updated = update_rows(cursor, Base, rows)
+        for item_type, model in ITEM_MODELS.items():
+            children = [row for row in rows if row["type"] == item_type]
+            if children:
+                update_rows(cursor, model, children)
+        refresh_feed(updated)
+    if updated:
+        bump_generation()
+    return len(updated)
+
+
+class ItemWriter:
+    """
+    Buffers parsed Hacker News items and writes them in batches, one
+    transaction and one INSERT per table per batch. Items whose HN_id is
+    already stored are skipped, so overlapping syncs are harmless.
+
+    Items can arrive in any order: those whose parent isn't stored yet are
+    queued in PendingParent and linked by the flush that writes the parent.
+
+    With autoflush=False, add() never writes: the caller flushes, e.g. in a
+    transaction of its own.
+    """
+
+    def __init__(self, batch_size=None, resolver=None, autoflush=True):
+        self.batch_size = batch_size or settings.HN_SYNC_BATCH_SIZE
+        self.resolver = resolver or ParentResolver()
+        self.autoflush = autoflush
+        self.pending = {}
+        self.inserted = 0
+
+    def add(self, item):
+        row = parse_item(item)
+        if row is None:
+            return
+        self.pending[row["HN_id"]] = row
+        if self.autoflush and len(self.pending) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        """
+        Writes out everything buffered and returns the rows that were
+        actually inserted.
+        """
+        if not self.pending:
+            return []
+        rows, self.pending = list(self.pending.values()), {}
+
+        start = time.perf_counter()
+        with transaction.atomic(), connection.cursor() as cursor:
+            inserted = insert_rows(cursor, Base, rows, conflict_field="HN_id")
+            rows = [row for row in rows if row["HN_id"] in inserted]
+            for row in rows:
+                self.resolver.add(row["HN_id"], row["id"], row["type"])
+            self.resolve_parents(rows)
+
+            for item_type, model in ITEM_MODELS.items():
+                children = [row for row in rows if row["type"] == item_type]
+                for row in children:
+                    row["base_ptr_id"] = row["id"]
+                if children:
+                    insert_rows(cursor, model, children)
+
+            orphans = [
+                {"item_id": row["id"], "parent_HN_id": row["parent_HN_id"]}
+                for row in rows
+                if row.get("parent_pending")
+            ]
+            if orphans:
+                insert_rows(cursor, PendingParent, orphans)
+            # Only this batch's entries, so parallel writers don't contend.
+            # An orphan whose parent lands in another writer's uncommitted
+            # batch is left for link_all_pending_parents
+            linked = link_pending_parents(cursor, rows)
+            written = [row["id"] for row in rows] + linked
+            refresh_feed(written + add_comments_to_counts(written))
+
+        WRITE_SECONDS.observe(time.perf_counter() - start)
+        WRITE_ITEMS.inc(len(rows))
+
+        if rows or linked:
+            bump_generation()
+        self.inserted += len(rows)
+        return rows
+
+    def resolve_parents(self, rows):
+        parents = self.resolver.resolve(row["parent_HN_id"] for row in rows if row["parent_HN_id"])
+
+        for row in rows:
+            if row["type"] not in ("comment", "pollopt") or not row["parent_HN_id"]:
+                continue
+            if row["parent_HN_id"] not in parents:
+                row["parent_pending"] = True
+                continue
+            pk, item_type = parents[row["parent_HN_id"]]
+            if row["type"] == "comment" or item_type == "poll":
+                row["parent_id"] = pk